@@ -7,7 +7,7 @@ import 'package:path_provider/path_provider.dart';
 
 class DatabaseService {
   static const _databaseName = "SignLanguage.db";
-  static const _databaseVersion = 1;
+  static const _databaseVersion = 2; // 2: name indexes
 
   // Table names
   static const tableAlphabets = 'alphabets';
@@ -40,6 +40,7 @@ class DatabaseService {
       path,
       version: _databaseVersion,
       onCreate: _onCreate,
+      onUpgrade: _onUpgrade,
     );
   }
 
@@ -77,6 +78,24 @@ class DatabaseService {
             $columnHandJson $blobType
           )
           ''');
+
+    await _createIndexes(db);
+  }
+
+  // Databases created at version 1 have no name indexes.
+  Future _onUpgrade(Database db, int oldVersion, int newVersion) async {
+    if (oldVersion < 2) {
+      await _createIndexes(db);
+    }
+  }
+
+  // Index the lookup column (same names as scripts/build_sign_database.py)
+  Future _createIndexes(Database db) async {
+    for (final table in [tableAlphabets, tableNumbers, tableWords]) {
+      await db.execute(
+        'CREATE INDEX IF NOT EXISTS idx_${table}_$columnName ON $table ($columnName)',
+      );
+    }
   }
 
   // --- Data Insertion with Gzip Compression ---
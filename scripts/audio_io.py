@@ -0,0 +1,161 @@
+import io
+import struct
+from math import gcd
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+# --- In-Memory Audio Decoding ---
+# Uploads are decoded straight from the request bytes into the 16 kHz mono
+# float32 array the processor takes as {"type": "audio", "audio": array}, the
+# same form the finetuning script feeds it. Nothing is written to disk.
+
+TARGET_SAMPLE_RATE = 16000
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioDecodeError(ValueError):
+    """Raised when an upload cannot be decoded as audio."""
+
+
+def _parse_pcm16_wav(data):
+    """
+    Returns `(samples, sample_rate, channels)` for a 16-bit PCM WAV, where
+    `samples` is an int16 view over `data` (no copy), or None for any other
+    kind of file so the caller can fall back to libsndfile.
+    """
+    view = memoryview(data)
+    if len(view) < 12 or view[0:4] != b"RIFF" or view[8:12] != b"WAVE":
+        return None
+
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size = struct.unpack_from("<I", view, offset + 4)[0]
+        body = offset + 8
+
+        if chunk_id == b"fmt ":
+            if chunk_size < 16 or body + 16 > len(view):
+                raise AudioDecodeError("Truncated WAV fmt chunk")
+            audio_format, channels, sample_rate = struct.unpack_from("<HHI", view, body)
+            bits_per_sample = struct.unpack_from("<H", view, body + 14)[0]
+            if audio_format == _WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                if body + 26 > len(view):
+                    raise AudioDecodeError("Truncated WAV fmt chunk")
+                audio_format = struct.unpack_from("<H", view, body + 24)[0]
+            if sample_rate == 0:
+                raise AudioDecodeError("WAV header has a sample rate of 0")
+            fmt = (audio_format, channels, sample_rate, bits_per_sample)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            audio_format, channels, sample_rate, bits_per_sample = fmt
+            if audio_format != _WAVE_FORMAT_PCM or bits_per_sample != 16 or channels < 1:
+                return None
+            # Recorders that stream WAV often leave the size as 0 or 0xFFFFFFFF
+            available = len(view) - body
+            if chunk_size == 0 or chunk_size > available:
+                chunk_size = available
+            frame_count = chunk_size // (2 * channels)
+            samples = np.frombuffer(view, dtype="<i2", count=frame_count * channels, offset=body)
+            return samples, sample_rate, channels
+
+        # Chunks are word aligned
+        offset = body + chunk_size + (chunk_size & 1)
+
+    return None
+
+
+def resample(audio, orig_sample_rate, target_sample_rate=TARGET_SAMPLE_RATE):
+    """Resamples a mono float32 array with a polyphase filter."""
+    if orig_sample_rate == target_sample_rate:
+        return audio
+    divisor = gcd(orig_sample_rate, target_sample_rate)
+    resampled = resample_poly(audio, target_sample_rate // divisor, orig_sample_rate // divisor)
+    return resampled.astype(np.float32, copy=False)
+
+
+def decode_audio(data, target_sample_rate=TARGET_SAMPLE_RATE):
+    """
+    Decodes an uploaded audio file (WAV, FLAC, Ogg/Opus, ...) held in memory
+    into a mono float32 array at `target_sample_rate`.
+
+    16-bit PCM WAV, which is what the app sends, is read through a view over the
+    upload bytes and converted to float32 in a single pass. Every other format
+    goes through libsndfile.
+    """
+    if not data:
+        raise AudioDecodeError("Empty audio upload")
+
+    wav = _parse_pcm16_wav(data)
+    if wav is not None:
+        samples, sample_rate, channels = wav
+        if channels == 1:
+            audio = samples.astype(np.float32)
+            audio *= 1.0 / 32768.0
+        else:
+            audio = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+            audio *= 1.0 / 32768.0
+    else:
+        try:
+            audio, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+        except Exception as e:
+            raise AudioDecodeError(f"Unsupported or corrupt audio file: {e}") from e
+        audio = audio[:, 0] if audio.shape[1] == 1 else audio.mean(axis=1, dtype=np.float32)
+
+    if len(audio) == 0:
+        raise AudioDecodeError("no audio samples")
+    return resample(np.ascontiguousarray(audio), sample_rate, target_sample_rate)
+
+
+# --- Silence Trimming & Loudness Normalization ---
+# The app's VAD hands over utterances with leading and trailing silence, and
+# every second of it costs audio tokens to prefill. Silence is trimmed by frame
+# energy (keeping `pad_ms` around the speech so word onsets are not clipped) and
+# the remaining audio is scaled to a common RMS level.
+
+
+def _frame_levels_db(audio, frame_length):
+    """RMS level in dBFS of each `frame_length`-sample frame (the last one zero padded)."""
+    frame_count = -(-len(audio) // frame_length)
+    frames = np.zeros(frame_count * frame_length, dtype=np.float32)
+    frames[:len(audio)] = audio
+    rms = np.sqrt(np.mean(np.square(frames.reshape(frame_count, frame_length)), axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+def trim_silence(audio, sample_rate=TARGET_SAMPLE_RATE, threshold_db=-45.0, frame_ms=20.0, pad_ms=200.0):
+    """
+    Returns a view of `audio` without the leading and trailing frames quieter
+    than `threshold_db` dBFS, keeping `pad_ms` either side. Audio with no frame
+    above the threshold is returned unchanged.
+    """
+    frame_length = max(1, int(sample_rate * frame_ms / 1000))
+    if len(audio) <= frame_length:
+        return audio
+    active = np.flatnonzero(_frame_levels_db(audio, frame_length) > threshold_db)
+    if len(active) == 0:
+        return audio
+    pad = int(sample_rate * pad_ms / 1000)
+    start = max(0, active[0] * frame_length - pad)
+    end = min(len(audio), (active[-1] + 1) * frame_length + pad)
+    return audio[start:end]
+
+
+def normalize_loudness(audio, target_dbfs=-20.0, max_gain_db=20.0, peak=0.99):
+    """
+    Scales `audio` so its RMS level is `target_dbfs`, with the gain limited to
+    +/- `max_gain_db` and so that no sample exceeds `peak`.
+    """
+    if len(audio) == 0:
+        return audio
+    rms = float(np.sqrt(np.mean(np.square(audio))))
+    if rms <= 0:
+        return audio
+    gain_db = np.clip(target_dbfs - 20 * np.log10(rms), -max_gain_db, max_gain_db)
+    gain = min(10 ** (gain_db / 20), peak / float(np.max(np.abs(audio))))
+    return (audio * gain).astype(np.float32, copy=False)
+
@@ -0,0 +1,320 @@
+import argparse
+import http.client
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import numpy as np
+
+# --- Transcription Server Benchmark ---
+# Starts unsloth_api.py with the stub backend (GEMMA_BACKEND=stub) and drives
+# /transcribe and /transcribe_stream with multipart WAV uploads, either closed
+# loop (a fixed number of clients sending back to back) or open loop (a fixed
+# request rate, bounded by the concurrency). For each level it reports latency
+# percentiles, throughput, errors and time-to-first-token, and writes everything
+# to a JSON file so runs on different commits can be compared:
+#
+#   python benchmark_server.py --concurrency 1,4,16 --output before.json
+#   python benchmark_server.py --concurrency 1,4,16 --output after.json --compare before.json
+#
+# With --backends stub,cpu the whole run is repeated against a server on each
+# backend and a per-request latency comparison is printed at the end.
+#
+# Time-to-first-token is the time until the first `text` event of
+# /transcribe_stream; for /transcribe it is the time until the response arrives.
+# Pass --url to benchmark a server that is already running instead.
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "unsloth_api.py")
+SAMPLE_RATE = 16000
+PROMPT = "Please transcribe this audio and concat with it's ASL gloss with <ASL> </ASL> tag"
+
+
+def make_wav(seconds, seed):
+    """A PCM16 mono WAV of a tone plus noise; each seed gives different bytes, so no response cache hits."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def encode_multipart(audio_bytes, prompt):
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        f"--{boundary}\r\n".encode(),
+        b'Content-Disposition: form-data; name="prompt"\r\n\r\n',
+        prompt.encode("utf-8"), b"\r\n",
+        f"--{boundary}\r\n".encode(),
+        b'Content-Disposition: form-data; name="audio"; filename="clip.wav"\r\n',
+        b"Content-Type: audio/wav\r\n\r\n",
+        audio_bytes, b"\r\n",
+        f"--{boundary}--\r\n".encode(),
+    ])
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def send_request(host, port, endpoint, body, content_type, timeout):
+    """
+    Sends one upload and returns `{"status", "latency_s", "ttft_s", "error"}`.
+    Transport errors are reported with status 0.
+    """
+    started = time.perf_counter()
+    result = {"status": 0, "latency_s": None, "ttft_s": None, "error": None}
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request("POST", endpoint, body=body, headers={"Content-Type": content_type})
+        response = connection.getresponse()
+        result["status"] = response.status
+        if endpoint == "/transcribe_stream" and response.status == 200:
+            for line in response:
+                if line.startswith(b"event: text") and result["ttft_s"] is None:
+                    result["ttft_s"] = time.perf_counter() - started
+                elif line.startswith(b"event: error"):
+                    result["error"] = "error event"
+        else:
+            response.read()
+            result["ttft_s"] = time.perf_counter() - started
+        if response.status != 200:
+            result["error"] = f"HTTP {response.status}"
+    except (OSError, http.client.HTTPException) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        connection.close()
+    result["latency_s"] = time.perf_counter() - started
+    return result
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(np.mean(values))}
+
+
+def run_level(host, port, endpoint, concurrency, rate, num_requests, uploads, timeout):
+    """
+    Sends `num_requests` uploads with at most `concurrency` in flight. With a
+    `rate` (requests/s) they are started on a fixed schedule, otherwise each
+    client sends its next request as soon as the previous one finishes.
+    """
+    results = []
+    lock = threading.Lock()
+
+    def one(index):
+        body, content_type = uploads[index % len(uploads)]
+        result = send_request(host, port, endpoint, body, content_type, timeout)
+        with lock:
+            results.append(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index in range(num_requests):
+            if rate:
+                delay = started + index / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(one, index)
+    elapsed = time.perf_counter() - started
+
+    ok = [result for result in results if result["error"] is None]
+    statuses = {}
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "rate": rate,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "statuses": statuses,
+        "wall_s": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency_s": percentiles([result["latency_s"] for result in ok]),
+        "ttft_s": percentiles([result["ttft_s"] for result in ok if result["ttft_s"] is not None]),
+    }
+
+
+def wait_until_ready(host, port, timeout, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        connection = http.client.HTTPConnection(host, port, timeout=2)
+        try:
+            connection.request("GET", "/readyz")
+            response = connection.getresponse()
+            if response.status == 200:
+                return
+            state = json.loads(response.read() or b"{}")
+            if state.get("state") == "failed":
+                raise RuntimeError(f"Server failed to start: {state.get('error')}")
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+        time.sleep(0.2)
+    raise TimeoutError(f"Server not ready after {timeout}s")
+
+
+def start_server(args, backend):
+    """Starts unsloth_api.py on `backend` and returns the process."""
+    env = dict(os.environ)
+    env.update({
+        "GEMMA_BACKEND": backend,
+        "GEMMA_STUB_PER_TOKEN_DELAY_MS": str(args.per_token_delay_ms),
+        "GEMMA_STUB_PREFILL_DELAY_MS": str(args.prefill_delay_ms),
+        "GEMMA_PORT": str(args.port),
+        "GEMMA_SERVER": args.server,
+        "GEMMA_DEVICE": "cpu",
+        "GEMMA_LOG_LEVEL": "WARNING",
+        "GEMMA_RESPONSE_CACHE_MAX_BYTES": "0",
+    })
+    env.update(args.server_env)
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    return subprocess.Popen([sys.executable, SERVER_SCRIPT], env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(SERVER_SCRIPT), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:8.1f}" if seconds is not None else "       -"
+
+
+def print_level(level, baseline=None):
+    latency, ttft = level["latency_s"], level["ttft_s"]
+    line = (f"{level['backend']:<8} {level['endpoint']:<19} c={level['concurrency']:<3} rate={level['rate'] or '-':<5} "
+            f"p50={format_ms(latency['p50'])} p95={format_ms(latency['p95'])} p99={format_ms(latency['p99'])} ms  "
+            f"ttft p50={format_ms(ttft['p50'])} ms  {level['throughput_rps']:7.2f} req/s  "
+            f"errors={level['error_rate']:.1%}")
+    if baseline and baseline["latency_s"]["p50"] and latency["p50"]:
+        change = latency["p50"] / baseline["latency_s"]["p50"] - 1
+        line += f"  p50 {change:+.1%} vs baseline"
+    print(line)
+
+
+def print_backend_comparison(levels):
+    """p50/p95 latency per request of every backend, side by side."""
+    backends = list(dict.fromkeys(level["backend"] for level in levels))
+    by_key = {(level["backend"], level["endpoint"], level["concurrency"]): level for level in levels}
+    print("\nLatency per request (p50 / p95 ms) by backend")
+    print(f"{'endpoint':<19} {'c':<4}" + "".join(f"{backend:>22}" for backend in backends))
+    for endpoint, concurrency in dict.fromkeys((level["endpoint"], level["concurrency"]) for level in levels):
+        cells = []
+        for backend in backends:
+            level = by_key.get((backend, endpoint, concurrency))
+            latency = level["latency_s"] if level else {"p50": None, "p95": None}
+            cells.append(f"{format_ms(latency['p50'])} / {format_ms(latency['p95'])}".rjust(22))
+        print(f"{endpoint:<19} {concurrency:<4}" + "".join(cells))
+
+
+def run_backend(args, backend, host, port, baseline):
+    """Runs every endpoint and concurrency level against one server; returns `(ready_s, levels)`."""
+    process = None if args.url else start_server(args, backend)
+    try:
+        startup_started = time.perf_counter()
+        wait_until_ready(host, port, args.timeout, process)
+        ready_s = time.perf_counter() - startup_started
+
+        uploads = [encode_multipart(make_wav(args.audio_seconds, seed), PROMPT) for seed in range(args.requests)]
+        # One request so lazy imports and first-request setup are not counted
+        send_request(host, port, "/transcribe_stream", *uploads[0], args.timeout)
+
+        levels = []
+        for endpoint in args.endpoints.split(","):
+            for concurrency in (int(value) for value in args.concurrency.split(",")):
+                level = run_level(host, port, endpoint, concurrency, args.rate, args.requests, uploads, args.timeout)
+                level["backend"] = backend
+                print_level(level, baseline.get((backend, endpoint, concurrency, args.rate)))
+                levels.append(level)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return ready_s, levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the transcription server")
+
+    def env_assignment(item):
+        name, separator, value = item.partition("=")
+        if not separator or not name:
+            parser.error(f"--server-env expects NAME=VALUE, got {item!r}")
+        return name, value
+
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--server", default="flask", choices=["flask", "waitress"])
+    parser.add_argument("--server-env", action="append", default=[], type=env_assignment, metavar="NAME=VALUE",
+                        help="Extra environment for the started server, e.g. GEMMA_BATCH_MAX_SIZE=1")
+    parser.add_argument("--server-log", help="Write the started server's output to this file")
+    parser.add_argument("--backends", default="stub",
+                        help="Comma separated GEMMA_BACKEND values to start and compare, e.g. stub,cpu")
+    parser.add_argument("--per-token-delay-ms", type=float, default=5.0)
+    parser.add_argument("--prefill-delay-ms", type=float, default=0.0, help="Stub prefill cost per prompt token")
+    parser.add_argument("--endpoints", default="/transcribe,/transcribe_stream")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma separated concurrency levels")
+    parser.add_argument("--rate", type=float, default=0.0, help="Requests/s per level (0 = closed loop)")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per level")
+    parser.add_argument("--audio-seconds", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare p50 latency against")
+    args = parser.parse_args()
+
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+        backends = ["external"]
+    else:
+        host, port = "127.0.0.1", args.port
+        backends = args.backends.split(",")
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            for level in json.load(f)["levels"]:
+                baseline[(level["backend"], level["endpoint"], level["concurrency"], level["rate"])] = level
+
+    ready_s, levels = {}, []
+    for backend in backends:
+        ready_s[backend], backend_levels = run_backend(args, backend, host, port, baseline)
+        levels.extend(backend_levels)
+    if len(backends) > 1:
+        print_backend_comparison(levels)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "ready_s": ready_s,
+        "levels": levels,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import gzip
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# --- Offline Sign Database Builder ---
+# Builds SignLanguage.db from assets/signs ahead of time instead of seeding it
+# on the device, where the seeders load and insert one sign at a time. The
+# schema and version (PRAGMA user_version, which sqflite reads) match
+# DatabaseService, and the blobs are the same gzipped JSON text, so the app
+# reads the file unchanged:
+#
+#   alphabets  alphabets/{pose,hand}/{A..Z}_pose_landmarks.json / _landmarks.json
+#   numbers    numbers/{pose,hand}/{0..30}_pose_landmarks.json / _landmarks.json
+#   words      words/{pose,hand}/{word}.json
+#
+# Files are read and compressed by a process pool; the rows of each table are
+# inserted in one transaction, and the `name` indexes are built after the
+# inserts.
+#
+#   python build_sign_database.py assets/signs SignLanguage.db
+
+DATABASE_VERSION = 2  # DatabaseService._databaseVersion; 2 added the name indexes
+TABLES = ("alphabets", "numbers", "words")
+# table: (pose file suffix, hand file suffix)
+ASSET_SUFFIXES = {
+    "alphabets": ("_pose_landmarks.json", "_landmarks.json"),
+    "numbers": ("_pose_landmarks.json", "_landmarks.json"),
+    "words": (".json", ".json"),
+}
+
+
+def _sort_key(table, name):
+    # Insert in the seeders' order: A..Z, 0..30 numerically, then words by name
+    if table == "numbers" and name.isdigit():
+        return (0, int(name), name)
+    return (1, 0, name)
+
+
+def list_signs(signs_dir, table):
+    """`(name, pose_path, hand_path)` for every pose file of `table`, in insertion order."""
+    pose_suffix, hand_suffix = ASSET_SUFFIXES[table]
+    pose_dir = os.path.join(signs_dir, table, "pose")
+    hand_dir = os.path.join(signs_dir, table, "hand")
+    if not os.path.isdir(pose_dir):
+        return []
+    names = [filename[:-len(pose_suffix)] for filename in os.listdir(pose_dir) if filename.endswith(pose_suffix)]
+    return [
+        (name, os.path.join(pose_dir, name + pose_suffix), os.path.join(hand_dir, name + hand_suffix))
+        for name in sorted(names, key=lambda name: _sort_key(table, name))
+    ]
+
+
+def compress_sign(sign, level=6):
+    """
+    Reads and gzips one sign's pose and hand JSON. Returns `(name, pose_gz,
+    hand_gz, raw_bytes)`, or `(name, None, None, error)` when a file is missing.
+    """
+    name, pose_path, hand_path = sign
+    try:
+        with open(pose_path, "rb") as f:
+            pose = f.read()
+        with open(hand_path, "rb") as f:
+            hand = f.read()
+    except OSError as e:
+        return name, None, None, str(e)
+    # mtime=0 keeps the output byte-identical across builds
+    return (name, gzip.compress(pose, level, mtime=0), gzip.compress(hand, level, mtime=0),
+            len(pose) + len(hand))
+
+
+def create_schema(db):
+    for table in TABLES:
+        db.execute(f"""
+            CREATE TABLE {table} (
+                _id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                pose_json_gz BLOB NOT NULL,
+                hand_json_gz BLOB NOT NULL
+            )
+        """)
+    db.execute(f"PRAGMA user_version = {DATABASE_VERSION}")
+
+
+def build_database(signs_dir, output_path, workers=None, level=6, chunksize=16):
+    """
+    Writes a new database to `output_path` (replacing it only once the build
+    has succeeded) and returns per-table stats.
+    """
+    temp_path = output_path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    stats = {}
+    db = sqlite3.connect(temp_path, isolation_level=None)
+    try:
+        # Nothing to recover if the build dies half way, so skip the journal
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        create_schema(db)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for table in TABLES:
+                signs = list_signs(signs_dir, table)
+                rows, errors, raw_bytes, stored_bytes = [], [], 0, 0
+                for name, pose_gz, hand_gz, extra in pool.map(
+                        compress_sign, signs, [level] * len(signs), chunksize=chunksize):
+                    if pose_gz is None:
+                        errors.append(f"{name}: {extra}")
+                        continue
+                    rows.append((name, pose_gz, hand_gz))
+                    raw_bytes += extra
+                    stored_bytes += len(pose_gz) + len(hand_gz)
+
+                db.execute("BEGIN")
+                db.executemany(f"INSERT INTO {table} (name, pose_json_gz, hand_json_gz) VALUES (?, ?, ?)", rows)
+                db.execute(f"CREATE INDEX idx_{table}_name ON {table} (name)")
+                db.execute("COMMIT")
+                stats[table] = {"signs": len(rows), "errors": errors, "json_bytes": raw_bytes,
+                                "gzip_bytes": stored_bytes}
+        db.execute("ANALYZE")
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    os.replace(temp_path, output_path)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build SignLanguage.db from the sign asset files")
+    parser.add_argument("signs_dir", help="The assets/signs directory")
+    parser.add_argument("output", nargs="?", default="SignLanguage.db")
+    parser.add_argument("--workers", type=int, default=None, help="Compression processes (default: CPU count)")
+    parser.add_argument("--level", type=int, default=6, help="gzip level (6 matches the app's GZipCodec)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = build_database(args.signs_dir, args.output, workers=args.workers, level=args.level)
+    elapsed = time.perf_counter() - started
+
+    for table, table_stats in stats.items():
+        ratio = table_stats["json_bytes"] / max(table_stats["gzip_bytes"], 1)
+        print(f"{table:<10} {table_stats['signs']:6d} signs  {table_stats['json_bytes'] / 2**20:8.1f} MiB JSON  "
+              f"-> {table_stats['gzip_bytes'] / 2**20:7.1f} MiB gzip ({ratio:.1f}x)")
+        for error in table_stats["errors"]:
+            print(f"  skipped {error}")
+    print(f"Built {args.output} in {elapsed:.1f}s, {os.path.getsize(args.output) / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import gzip
+import json
+import struct
+import zlib
+import numpy as np
+
+# --- Binary Pose/Hand Frame Codec ---
+# Sign animations are stored as gzipped JSON (`pose_json_gz` / `hand_json_gz`):
+#
+#   pose: {"frames": [{"frame_index": 0, "landmarks": {"NOSE": {"x", "y", "z", ...}, ...}}, ...]}
+#   hand: {"frames": [{"frame_index": 0, "landmarks": {"right_hand": {"WRIST": {...}, ...},
+#                                                      "left_hand": {...}}}, ...]}
+#
+# This codec packs the same data into arrays in a fixed landmark order:
+#
+#   header   magic, version, kind (pose/hand), quantization, flags, frame and
+#            landmark counts, and the per-axis offset/scale for int16
+#   indices  frame_index per frame (int32)
+#   mask     one bit per frame and landmark: was it detected
+#   coords   x/y/z per frame and landmark, as float16 or as int16 quantized
+#            over each axis' range
+#
+# With delta encoding each frame stores its difference from the previous one
+# (modulo 2^16, so it is lossless on the 16-bit values); consecutive frames are
+# close, so the deltas are small and the payload deflates well. Only x/y/z are
+# kept: the app ignores `visibility`.
+
+POSE_LANDMARKS = (
+    "NOSE", "LEFT_EYE_INNER", "LEFT_EYE", "LEFT_EYE_OUTER", "RIGHT_EYE_INNER", "RIGHT_EYE",
+    "RIGHT_EYE_OUTER", "LEFT_EAR", "RIGHT_EAR", "MOUTH_LEFT", "MOUTH_RIGHT", "LEFT_SHOULDER",
+    "RIGHT_SHOULDER", "LEFT_ELBOW", "RIGHT_ELBOW", "LEFT_WRIST", "RIGHT_WRIST", "LEFT_PINKY",
+    "RIGHT_PINKY", "LEFT_INDEX", "RIGHT_INDEX", "LEFT_THUMB", "RIGHT_THUMB", "LEFT_HIP", "RIGHT_HIP",
+    "LEFT_KNEE", "RIGHT_KNEE", "LEFT_ANKLE", "RIGHT_ANKLE", "LEFT_HEEL", "RIGHT_HEEL",
+    "LEFT_FOOT_INDEX", "RIGHT_FOOT_INDEX",
+)
+HAND_LANDMARKS = (
+    "WRIST", "THUMB_CMC", "THUMB_MCP", "THUMB_IP", "THUMB_TIP",
+    "INDEX_FINGER_MCP", "INDEX_FINGER_PIP", "INDEX_FINGER_DIP", "INDEX_FINGER_TIP",
+    "MIDDLE_FINGER_MCP", "MIDDLE_FINGER_PIP", "MIDDLE_FINGER_DIP", "MIDDLE_FINGER_TIP",
+    "RING_FINGER_MCP", "RING_FINGER_PIP", "RING_FINGER_DIP", "RING_FINGER_TIP",
+    "PINKY_MCP", "PINKY_PIP", "PINKY_DIP", "PINKY_TIP",
+)
+HAND_GROUPS = ("right_hand", "left_hand")
+
+KIND_POSE = 0
+KIND_HAND = 1
+QUANT_FLOAT16 = 0
+QUANT_INT16 = 1
+FLAG_DELTA = 1
+FLAG_DEFLATE = 2
+
+MAGIC = b"SGNF"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBBBIH2x3f3f")
+_AXES = ("x", "y", "z")
+
+
+def landmark_layout(kind):
+    """`(group, name)` pairs in storage order; the group is None for pose frames."""
+    if kind == KIND_POSE:
+        return [(None, name) for name in POSE_LANDMARKS]
+    return [(group, name) for group in HAND_GROUPS for name in HAND_LANDMARKS]
+
+
+class FrameArrays:
+    """
+    Decoded frames: `frame_index` int32[frames], `coords` float32[frames,
+    landmarks, 3] in `landmark_layout(kind)` order, NaN where not detected.
+    """
+
+    def __init__(self, kind, frame_index, coords):
+        self.kind = kind
+        self.frame_index = frame_index
+        self.coords = coords
+
+    @classmethod
+    def from_json(cls, data, kind):
+        """Builds the arrays from a parsed pose or hand JSON document."""
+        layout = landmark_layout(kind)
+        slots = {key: slot for slot, key in enumerate(layout)}
+        frames = data["frames"]
+        frame_index = np.empty(len(frames), dtype=np.int32)
+        coords = np.full((len(frames), len(layout), 3), np.nan, dtype=np.float32)
+
+        for row, frame in enumerate(frames):
+            frame_index[row] = frame["frame_index"]
+            landmarks = frame.get("landmarks") or {}
+            groups = [(None, landmarks)] if kind == KIND_POSE else [
+                (group, landmarks.get(group) or {}) for group in HAND_GROUPS
+            ]
+            for group, points in groups:
+                for name, point in points.items():
+                    slot = slots.get((group, name))
+                    if slot is None:
+                        raise ValueError(f"Unknown landmark {name!r}")
+                    if point is not None:
+                        coords[row, slot] = (point.get("x", 0.0), point.get("y", 0.0), point.get("z", 0.0))
+        return cls(kind, frame_index, coords)
+
+    def to_json(self, decimals=None):
+        """Rebuilds the JSON document (without `visibility`), optionally rounding the coordinates."""
+        layout = landmark_layout(self.kind)
+        present = ~np.isnan(self.coords[:, :, 0])
+        coords = self.coords.astype(np.float64)
+        if decimals is not None:
+            coords = np.round(coords, decimals)
+        frames = []
+        for row in range(len(self.frame_index)):
+            landmarks = {} if self.kind == KIND_POSE else {group: {} for group in HAND_GROUPS}
+            for slot in np.flatnonzero(present[row]):
+                group, name = layout[slot]
+                x, y, z = coords[row, slot].tolist()
+                target = landmarks if group is None else landmarks[group]
+                target[name] = {"x": x, "y": y, "z": z}
+            frames.append({"frame_index": int(self.frame_index[row]), "landmarks": landmarks})
+        return {"frames": frames}
+
+
+def encode(frames, quantization=QUANT_INT16, delta=True, deflate=True):
+    """Packs a `FrameArrays` into bytes."""
+    coords = frames.coords
+    frame_count, landmark_count, _ = coords.shape
+    present = ~np.isnan(coords[:, :, 0])
+
+    # Undetected landmarks repeat the previous value so they cost nothing once delta encoded
+    filled = coords.copy()
+    for row in range(1, frame_count):
+        missing = ~present[row]
+        filled[row, missing] = filled[row - 1, missing]
+    filled = np.nan_to_num(filled)
+
+    offsets = np.zeros(3, dtype=np.float32)
+    scales = np.zeros(3, dtype=np.float32)
+    if quantization == QUANT_INT16:
+        values = coords[present] if present.any() else np.zeros((1, 3), dtype=np.float32)
+        offsets = values.min(axis=0).astype(np.float32)
+        scales = ((values.max(axis=0) - offsets) / 65535).astype(np.float32)
+        scales[scales == 0] = 1.0
+        packed = np.clip(np.round((filled - offsets) / scales), 0, 65535).astype(np.uint16)
+    elif quantization == QUANT_FLOAT16:
+        packed = filled.astype(np.float16).view(np.uint16)
+    else:
+        raise ValueError(f"Unknown quantization {quantization}")
+
+    if delta and frame_count > 1:
+        packed = np.concatenate([packed[:1], np.diff(packed, axis=0)])  # uint16 wraps around
+
+    flags = (FLAG_DELTA if delta else 0) | (FLAG_DEFLATE if deflate else 0)
+    header = _HEADER.pack(MAGIC, VERSION, frames.kind, quantization, flags, frame_count, landmark_count,
+                          *offsets.tolist(), *scales.tolist())
+    payload = b"".join([
+        frames.frame_index.astype("<i4").tobytes(),
+        np.packbits(present).tobytes(),
+        packed.astype("<u2").tobytes(),
+    ])
+    return header + (zlib.compress(payload, 6) if deflate else payload)
+
+
+def decode(blob):
+    """Unpacks bytes written by `encode` into a `FrameArrays`."""
+    magic, version, kind, quantization, flags, frame_count, landmark_count, *axis_params = \
+        _HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a frame codec blob")
+    payload = blob[_HEADER.size:]
+    if flags & FLAG_DEFLATE:
+        payload = zlib.decompress(payload)
+
+    offset = 4 * frame_count
+    frame_index = np.frombuffer(payload, dtype="<i4", count=frame_count).astype(np.int32)
+    mask_bytes = (frame_count * landmark_count + 7) // 8
+    present = np.unpackbits(np.frombuffer(payload, dtype=np.uint8, count=mask_bytes, offset=offset),
+                            count=frame_count * landmark_count).astype(bool).reshape(frame_count, landmark_count)
+    offset += mask_bytes
+    packed = np.frombuffer(payload, dtype="<u2", count=frame_count * landmark_count * 3, offset=offset)
+    packed = packed.reshape(frame_count, landmark_count, 3)
+
+    if flags & FLAG_DELTA:
+        packed = np.cumsum(packed, axis=0, dtype=np.uint16)
+    if quantization == QUANT_INT16:
+        offsets = np.array(axis_params[:3], dtype=np.float32)
+        scales = np.array(axis_params[3:], dtype=np.float32)
+        coords = packed.astype(np.float32) * scales + offsets
+    else:
+        coords = packed.view(np.float16).astype(np.float32)
+    coords[~present] = np.nan
+    return FrameArrays(kind, frame_index, coords)
+
+
+def max_quantization_error(blob):
+    """Largest absolute coordinate error `decode(blob)` can have (float16: relative to 1.0)."""
+    _, _, _, quantization, _, _, _, *axis_params = _HEADER.unpack_from(blob)
+    if quantization == QUANT_INT16:
+        offsets, scales = axis_params[:3], axis_params[3:]
+        magnitude = max(abs(offset) + scale * 65535 for offset, scale in zip(offsets, scales))
+        return max(scales) / 2 + magnitude * 2.0 ** -23  # plus float32 rounding
+    return 2.0 ** -11  # float16 rounding for values up to 1.0
+
+
+# --- Benchmark ---
+# Compares the codec with the current gzip JSON on a directory of pose/hand
+# JSON files (e.g. assets/signs/words/pose), or on synthetic signs if none is
+# given:
+#   python frame_codec.py [assets/signs/words]
+if __name__ == "__main__":
+    import glob
+    import os
+    import sys
+    import time
+
+    def synthetic_sign(kind, frame_count, rng):
+        layout = landmark_layout(kind)
+        base = rng.uniform(0.2, 0.8, size=(len(layout), 3)) * (1, 1, 0.1)
+        walk = np.cumsum(rng.normal(0, 0.004, size=(frame_count, len(layout), 3)), axis=0)
+        coords = (base + walk).astype(np.float32)
+        if kind == KIND_HAND:
+            coords[rng.random(frame_count) < 0.3, len(HAND_LANDMARKS):] = np.nan  # left hand often missing
+        return FrameArrays(kind, np.arange(frame_count, dtype=np.int32), coords).to_json()
+
+    documents = []
+    if len(sys.argv) > 1:
+        for kind, folder in ((KIND_POSE, "pose"), (KIND_HAND, "hand")):
+            for path in sorted(glob.glob(os.path.join(sys.argv[1], folder, "*.json"))):
+                with open(path) as f:
+                    documents.append((kind, json.load(f)))
+    else:
+        rng = np.random.default_rng(0)
+        documents = [(kind, synthetic_sign(kind, int(rng.integers(40, 120)), rng))
+                     for _ in range(100) for kind in (KIND_POSE, KIND_HAND)]
+
+    frame_total = sum(len(document["frames"]) for _, document in documents)
+    gzipped = [gzip.compress(json.dumps(document).encode()) for _, document in documents]
+
+    started = time.perf_counter()
+    for blob in gzipped:
+        for frame in json.loads(gzip.decompress(blob))["frames"]:
+            for value in frame["landmarks"].values():
+                pass
+    json_decode_s = time.perf_counter() - started
+    gzip_bytes = sum(len(blob) for blob in gzipped)
+    print(f"{len(documents)} documents, {frame_total} frames")
+    print(f"gzip JSON          {gzip_bytes / 1024:9.1f} KiB  decode {frame_total / json_decode_s:10.0f} frames/s")
+
+    for label, quantization, delta in (("float16", QUANT_FLOAT16, False), ("float16+delta", QUANT_FLOAT16, True),
+                                       ("int16", QUANT_INT16, False), ("int16+delta", QUANT_INT16, True)):
+        arrays = [FrameArrays.from_json(document, kind) for kind, document in documents]
+        blobs = [encode(frames, quantization, delta) for frames in arrays]
+        started = time.perf_counter()
+        decoded = [decode(blob) for blob in blobs]
+        decode_s = time.perf_counter() - started
+        error = max(float(np.nanmax(np.abs(out.coords - original.coords), initial=0))
+                    for out, original in zip(decoded, arrays))
+        size = sum(len(blob) for blob in blobs)
+        print(f"{label:<18} {size / 1024:9.1f} KiB  decode {frame_total / decode_s:10.0f} frames/s  "
+              f"ratio {gzip_bytes / size:5.2f}x  max error {error:.2e}")
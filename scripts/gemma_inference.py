@@ -0,0 +1,397 @@
+import math
+import re
+import time
+from concurrent.futures import Future
+from threading import Thread
+
+# --- Shared Prompt ---
+# The system turn every /transcribe request starts with.
+SYSTEM_PROMPT = "You are an assistant that transcribes speech accurately."
+
+ASL_PATTERN = re.compile(r"<ASL>(.*?)</ASL>")
+
+# --- Generation Settings ---
+# Gemma 3n's recommended sampling settings. These also feed the response cache
+# key, so changing them invalidates cached responses.
+MAX_NEW_TOKENS = 256
+SAMPLING_PARAMS = {"temperature": 1.0, "top_p": 0.95, "top_k": 64}
+
+# --- Early Stopping & Token Budget ---
+# The output format ends at </ASL>, so each row stops as soon as it has
+# produced the closing tag instead of decoding until EOS; anything after it is
+# discarded by `parse_asl_response` anyway. The token budget grows with the
+# length of the audio: the transcript plus its gloss need roughly
+# TOKENS_PER_AUDIO_SECOND tokens per second of speech.
+STOP_TAG = "</ASL>"
+TOKENS_PER_AUDIO_SECOND = 12.0
+MIN_NEW_TOKENS = 48
+AUDIO_SAMPLE_RATE = 16000
+
+
+def build_messages(audio, prompt):
+    """
+    Builds the chat messages for one utterance. `audio` is anything the
+    processor accepts for an audio part (a file path or a float array).
+    """
+    return [
+        {
+            "role": "system",
+            "content": [
+                {
+                    "type": "text",
+                    "text": SYSTEM_PROMPT,
+                }
+            ],
+        },
+        {
+            "role": "user",
+            "content": [
+                {"type": "audio", "audio": audio},
+                {"type": "text", "text": prompt}
+            ]
+        }]
+
+
+def parse_asl_response(description):
+    """
+    Splits the generated text into the English sentence and the ASL gloss.
+    If no <ASL> tag is found, the whole text is treated as both.
+    """
+    asl_match = ASL_PATTERN.search(description)
+
+    if asl_match:
+        text = description.split("<ASL>")[0].strip()
+        asl_gloss = asl_match.group(1).strip()
+    else:
+        text = description.strip()
+        asl_gloss = description.strip()
+
+    return {"text": text, "asl_gloss": asl_gloss}
+
+
+def audio_duration(messages):
+    """Seconds of audio in `messages`, or None if its audio is not an array (e.g. a file path)."""
+    for message in messages:
+        for part in message["content"]:
+            if part["type"] == "audio" and not isinstance(part["audio"], str):
+                return len(part["audio"]) / AUDIO_SAMPLE_RATE
+    return None
+
+
+def max_new_tokens_for_audio(seconds, tokens_per_second=TOKENS_PER_AUDIO_SECOND,
+                             min_tokens=MIN_NEW_TOKENS, max_tokens=MAX_NEW_TOKENS):
+    """Token budget for `seconds` of audio, between `min_tokens` and `max_tokens`."""
+    if seconds is None:
+        return max_tokens
+    return int(min(max_tokens, max(min_tokens, math.ceil(seconds * tokens_per_second))))
+
+
+class StopOnTag:
+    """
+    Stopping criterion for `generate(stopping_criteria=[...])` that finishes
+    each row once its generated tokens contain `tag`. Only the last `window`
+    tokens are decoded per step, and never the prompt, which mentions the tag
+    itself. `rows_stopped` counts the rows it ended and `stop_steps` holds,
+    per row, the number of generated tokens when it did (None if it did not).
+    """
+
+    def __init__(self, tokenizer, prompt_length, tag=STOP_TAG, window=8):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.tag = tag
+        self.window = window
+        self.rows_stopped = 0
+        self.stop_steps = None
+
+    def __call__(self, input_ids, scores=None, **kwargs):
+        steps = len(input_ids[0]) - self.prompt_length
+        start = max(self.prompt_length, len(input_ids[0]) - self.window)
+        tails = self.tokenizer.batch_decode(input_ids[:, start:], skip_special_tokens=True)
+        if self.stop_steps is None:
+            self.stop_steps = [None] * len(tails)
+        done = []
+        for row, tail in enumerate(tails):
+            if self.stop_steps[row] is None and self.tag in tail:
+                self.stop_steps[row] = steps
+                self.rows_stopped += 1
+            done.append(self.stop_steps[row] is not None)
+        # generate() combines criteria as bool tensors on the model's device
+        return input_ids.new_tensor(done).bool() if hasattr(input_ids, "new_tensor") else done
+
+
+# --- Generation Timing ---
+class GenerationTimer:
+    """
+    Streamer hook that timestamps the first generated token (the end of the
+    prefill) and counts decode steps. Unlike `TextStreamer` it accepts any batch
+    size, and it forwards everything to an optional `inner` streamer.
+    """
+
+    def __init__(self, inner=None):
+        self.inner = inner
+        self.first_token_at = None
+        self.decode_steps = 0
+        self._prompt_pending = True
+
+    def put(self, value):
+        if self._prompt_pending:
+            # `generate` first hands the streamer the prompt
+            self._prompt_pending = False
+        else:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.decode_steps += 1
+        if self.inner is not None:
+            self.inner.put(value)
+
+    def end(self):
+        if self.inner is not None:
+            self.inner.end()
+
+
+def _row_lengths(rows, pad_token_id):
+    lengths = []
+    for row in rows:
+        ids = row.tolist() if hasattr(row, "tolist") else row
+        lengths.append(sum(1 for token_id in ids if token_id != pad_token_id))
+    return lengths
+
+
+def _stop_stats(stop_steps, lengths, max_new_tokens):
+    """
+    Per-row `stop_reason` ("tag", "eos" or "budget": the criterion that ended
+    the row) and `tag_saved_steps`, the budget still left when the tag ended
+    it. That is an upper bound: the model may have emitted EOS soon after.
+    """
+    rows = []
+    for stop_step, length in zip(stop_steps or [None] * len(lengths), lengths):
+        if stop_step is not None:
+            rows.append({"stop_reason": "tag", "tag_saved_steps": max(0, max_new_tokens - stop_step)})
+        else:
+            rows.append({"stop_reason": "eos" if length < max_new_tokens else "budget", "tag_saved_steps": 0})
+    return rows
+
+
+# --- Helper Functions for Inference ---
+def do_gemma_3n_batch_inference(model, tokenizer, batch_messages, max_new_tokens=MAX_NEW_TOKENS,
+                                streamer=None, device="cuda", prefix_cache=None, stats=None):
+    """
+    Runs several conversations through a single `generate` call and returns one
+    generated string per conversation, in the same order. A `streamer` receives
+    the tokens as they are decoded and only supports a batch of one.
+
+    With a `prefix_cache`, single-row inputs start from the prefilled shared
+    prefix instead of prefilling it again. Memory is not released here; see
+    `memory_policy.MemoryPolicy`.
+
+    Rows stop at the closing </ASL> tag or after `max_new_tokens`, whichever
+    comes first.
+
+    If a `stats` dict is given it is filled with the batch size, per-stage
+    seconds (`tokenize`, `prefill`, `decode`), `decode_steps`,
+    `generated_tokens`, the `max_new_tokens` budget and `rows`, one dict per
+    row with its `stop_reason` and `tag_saved_steps` (see `_stop_stats`).
+    """
+    started = time.perf_counter()
+
+    # Decoder-only models must be left padded so every row's prompt ends at the
+    # same position and the new tokens line up.
+    inner_tokenizer = getattr(tokenizer, "tokenizer", tokenizer)
+    inner_tokenizer.padding_side = "left"
+
+    inputs = tokenizer.apply_chat_template(
+        batch_messages,
+        add_generation_prompt=True,  # Crucial for generation tasks
+        tokenize=True,
+        return_dict=True,
+        return_tensors="pt",
+        padding=True,
+    ).to(device)
+    tokenized = time.perf_counter()
+
+    generate_kwargs = {}
+    if prefix_cache is not None:
+        past_key_values = prefix_cache.prefill(inputs)
+        if past_key_values is not None:
+            generate_kwargs["past_key_values"] = past_key_values
+
+    prompt_length = len(inputs["input_ids"][0])
+    timer = GenerationTimer(streamer)
+    stop_on_tag = StopOnTag(tokenizer, prompt_length)
+    outputs = model.generate(
+        **inputs,
+        max_new_tokens=max_new_tokens,
+        **SAMPLING_PARAMS,
+        use_cache=True, # Important for generation speed
+        streamer=timer,
+        stopping_criteria=[stop_on_tag],
+        **generate_kwargs,
+    )
+    generated = time.perf_counter()
+
+    # Decode only the newly generated tokens, skipping the (padded) input prompt
+    new_tokens = [row[prompt_length:] for row in outputs]
+
+    if stats is not None:
+        first_token_at = timer.first_token_at or generated
+        lengths = _row_lengths(new_tokens, getattr(inner_tokenizer, "pad_token_id", None))
+        stats.update(
+            batch_size=len(batch_messages),
+            tokenize=tokenized - started,
+            prefill=first_token_at - tokenized,
+            decode=generated - first_token_at,
+            decode_steps=timer.decode_steps,
+            generated_tokens=sum(lengths),
+            max_new_tokens=max_new_tokens,
+            rows=_stop_stats(stop_on_tag.stop_steps, lengths, max_new_tokens),
+        )
+
+    return tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+
+
+def do_gemma_3n_inference(model, tokenizer, messages, max_new_tokens=MAX_NEW_TOKENS,
+                          streamer=None, device="cuda", prefix_cache=None, stats=None):
+    """
+    Performs inference on the provided messages, captures the generated text, and returns it.
+    """
+    return do_gemma_3n_batch_inference(
+        model, tokenizer, [messages], max_new_tokens,
+        streamer=streamer, device=device, prefix_cache=prefix_cache, stats=stats,
+    )[0]
+
+
+def _run_in_thread(fn):
+    future = Future()
+
+    def target():
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+
+    Thread(target=target, daemon=True).start()
+    return future
+
+
+def stream_gemma_3n_inference(model, tokenizer, messages, max_new_tokens=MAX_NEW_TOKENS,
+                              run=None, device="cuda", prefix_cache=None, stats=None):
+    """
+    Starts a generation and returns an iterator over the generated text, yielded
+    in pieces while `generate` is still decoding.
+
+    `generate` pushes its tokens into a `TextIteratorStreamer`. `run` decides
+    where it executes: it receives a zero-argument function and must return a
+    Future for it (e.g. `scheduler.submit_async(fn, exclusive=True)`). Without
+    it, a background thread is used. Errors raised by `run` itself (such as a
+    full queue) surface here, before any text is yielded.
+    """
+    from transformers import TextIteratorStreamer
+
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+    def generate():
+        return do_gemma_3n_inference(
+            model, tokenizer, messages, max_new_tokens,
+            streamer=streamer, device=device, prefix_cache=prefix_cache, stats=stats,
+        )
+
+    future = (run or _run_in_thread)(generate)
+    # Unblock the iterator if the job fails or is dropped before it streams
+    future.add_done_callback(lambda _: streamer.end())
+
+    def chunks():
+        for chunk in streamer:
+            if chunk:
+                yield chunk
+        future.result()
+
+    return chunks()
+
+
+# --- Incremental <ASL> Parsing ---
+class AslStreamParser:
+    """
+    Turns streamed text into events as soon as they are complete:
+    ("text", delta) for the English sentence before <ASL>, and
+    ("gloss", word) for every whitespace-delimited word inside <ASL>...</ASL>.
+    Tags split across chunks are held back until they can be recognised.
+    """
+
+    OPEN_TAG = "<ASL>"
+    CLOSE_TAG = "</ASL>"
+
+    def __init__(self):
+        self._buffer = ""
+        self._word = ""
+        self._state = "text"
+
+    @staticmethod
+    def _partial_tag_length(buffer, tag):
+        # Length of the longest suffix of `buffer` that starts `tag`
+        for length in range(min(len(buffer), len(tag) - 1), 0, -1):
+            if tag.startswith(buffer[-length:]):
+                return length
+        return 0
+
+    def _feed_gloss(self, segment, events):
+        for char in segment:
+            if char.isspace():
+                if self._word:
+                    events.append(("gloss", self._word))
+                    self._word = ""
+            else:
+                self._word += char
+
+    def _flush_word(self, events):
+        if self._word:
+            events.append(("gloss", self._word))
+            self._word = ""
+
+    def feed(self, chunk):
+        events = []
+        self._buffer += chunk
+
+        while self._buffer and self._state != "done":
+            if self._state == "text":
+                index = self._buffer.find(self.OPEN_TAG)
+                if index >= 0:
+                    if index:
+                        events.append(("text", self._buffer[:index]))
+                    self._buffer = self._buffer[index + len(self.OPEN_TAG):]
+                    self._state = "gloss"
+                    continue
+                keep = self._partial_tag_length(self._buffer, self.OPEN_TAG)
+                ready = self._buffer[:len(self._buffer) - keep]
+                if ready:
+                    events.append(("text", ready))
+                self._buffer = self._buffer[len(ready):]
+                break
+
+            index = self._buffer.find(self.CLOSE_TAG)
+            if index >= 0:
+                self._feed_gloss(self._buffer[:index], events)
+                self._flush_word(events)
+                self._buffer = ""
+                self._state = "done"
+                break
+            keep = self._partial_tag_length(self._buffer, self.CLOSE_TAG)
+            ready = self._buffer[:len(self._buffer) - keep]
+            self._feed_gloss(ready, events)
+            self._buffer = self._buffer[len(ready):]
+            break
+
+        if self._state == "done":
+            self._buffer = ""
+        return events
+
+    def close(self):
+        """Flushes whatever is still held back once generation has finished."""
+        events = []
+        if self._state == "text" and self._buffer:
+            events.append(("text", self._buffer))
+        elif self._state == "gloss":
+            self._feed_gloss(self._buffer, events)
+            self._flush_word(events)
+        self._buffer = ""
+        self._state = "done"
+        return events
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import re
+import sqlite3
+
+# --- Gloss Translation Cache ---
+# English-to-gloss results persisted across synthesis runs, so sentences that
+# were glossed before (in this corpus, another split or another dataset) are
+# not sent to the LLM again.
+#
+# Keys are the normalized sentence (case folded, punctuation dropped except
+# apostrophes, whitespace collapsed). Entries live under a namespace hashed
+# from the model, the prompt template and the sampling parameters, so editing
+# any of them starts a fresh namespace and the old entries are simply no longer
+# read.
+
+_PUNCTUATION = re.compile(r"[^\w\s']")
+_BATCH = 500  # stays under SQLite's bound-parameter limit
+
+
+def normalize_text(text):
+    return " ".join(_PUNCTUATION.sub(" ", text.casefold()).split())
+
+
+def make_namespace(model, prompt_template, sampling_params):
+    """Hash of everything besides the sentence that determines the gloss."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (model, prompt_template, json.dumps(sampling_params, sort_keys=True)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class GlossCache:
+    """SQLite-backed map from normalized sentence to gloss within one namespace."""
+
+    def __init__(self, path, namespace):
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        # Data-parallel workers on one node share the file; wait out their writes
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS glosses ("
+            "namespace TEXT NOT NULL, text TEXT NOT NULL, gloss TEXT NOT NULL, PRIMARY KEY (namespace, text))"
+        )
+        self._db.commit()
+
+    def get_many(self, keys):
+        """`{key: gloss}` for the normalized `keys` that are cached."""
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), _BATCH):
+            batch = keys[i : i + _BATCH]
+            rows = self._db.execute(
+                f"SELECT text, gloss FROM glosses WHERE namespace = ? AND text IN ({','.join('?' * len(batch))})",
+                [self.namespace, *batch],
+            ).fetchall()
+            found.update(rows)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Stores `(key, gloss)` pairs in one transaction."""
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO glosses (namespace, text, gloss) VALUES (?, ?, ?)",
+                [(self.namespace, key, gloss) for key, gloss in items],
+            )
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,181 @@
+import os
+import re
+import sqlite3
+
+# --- Gloss Resolution ---
+# The app plays a gloss word by word: it queries SignLanguage.db for each word
+# and, when nothing comes back, fingerspells it with one query per letter. The
+# server knows the same sign inventory (the `alphabets`, `numbers` and `words`
+# tables, or the asset files they are seeded from), so it resolves the whole
+# gloss up front into a playback plan the app can prefetch in one batch.
+#
+# Each gloss token becomes one step:
+#   fs-NAME            fingerspelled letter by letter
+#   A..Z               the letter sign
+#   12                 the number sign, or its digits if there is no sign for it
+#   CRY++ / APPLES     the word sign, else a lemma fallback (repetition marks,
+#                      plural and verb endings, IX-/POSS- prefixes stripped)
+#   anything else      fingerspelled
+
+TABLE_ALPHABETS = "alphabets"
+TABLE_NUMBERS = "numbers"
+TABLE_WORDS = "words"
+TABLES = (TABLE_ALPHABETS, TABLE_NUMBERS, TABLE_WORDS)
+
+_ASSET_SUFFIXES = ("_pose_landmarks.json", ".json")
+_PUNCTUATION = re.compile(r"[^\w+'-]")
+_INDEX_PREFIXES = ("IX-", "POSS-", "SELF-")
+_MEMO_SIZE = 10000
+
+
+def _asset_name(filename):
+    for suffix in _ASSET_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return None
+
+
+def _lemma_candidates(word):
+    """Base forms to try for an uppercase word, most specific first."""
+    candidates = []
+
+    def add(candidate):
+        if candidate and candidate != word and candidate not in candidates:
+            candidates.append(candidate)
+
+    stripped = word.rstrip("+")
+    add(stripped)
+    for prefix in _INDEX_PREFIXES:
+        if stripped.startswith(prefix):
+            add(stripped[len(prefix):])
+    if "-" in stripped:
+        add(stripped.replace("-", ""))
+        add(stripped.split("-")[0])
+
+    if stripped.endswith("IES") and len(stripped) > 4:
+        add(stripped[:-3] + "Y")
+    if stripped.endswith("ES") and len(stripped) > 3:
+        add(stripped[:-2])
+    if stripped.endswith("S") and not stripped.endswith("SS") and len(stripped) > 2:
+        add(stripped[:-1])
+    for suffix in ("ING", "ED"):
+        if stripped.endswith(suffix) and len(stripped) > len(suffix) + 2:
+            base = stripped[:-len(suffix)]
+            add(base)
+            add(base + "E")
+            if len(base) > 2 and base[-1] == base[-2]:
+                add(base[:-1])  # STOPPED -> STOP
+            if suffix == "ED" and base.endswith("I"):
+                add(base[:-1] + "Y")  # CRIED -> CRY
+    return candidates
+
+
+class SignLexicon:
+    """
+    In-memory index of the available sign names per table, each mapped to its
+    stored name and row id (None when built from asset files).
+    """
+
+    def __init__(self, entries):
+        # entries: {table: {lookup key: (stored name, row id)}}
+        self._entries = {table: dict(entries.get(table, {})) for table in TABLES}
+        self._memo = {}
+
+    @classmethod
+    def from_database(cls, path):
+        """Indexes a SignLanguage.db built by the app or by build_sign_database.py."""
+        entries = {}
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as db:
+            for table in TABLES:
+                rows = db.execute(f"SELECT _id, name FROM {table}").fetchall()
+                entries[table] = {name.upper(): (name, row_id) for row_id, name in rows}
+        return cls(entries)
+
+    @classmethod
+    def from_assets(cls, signs_dir):
+        """Indexes `signs_dir/{alphabets,numbers,words}/pose/*.json`."""
+        entries = {}
+        for table in TABLES:
+            pose_dir = os.path.join(signs_dir, table, "pose")
+            names = (_asset_name(filename) for filename in sorted(os.listdir(pose_dir))) if os.path.isdir(pose_dir) else ()
+            entries[table] = {name.upper(): (name, None) for name in names if name}
+        return cls(entries)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def _sign(self, table, key):
+        entry = self._entries[table].get(key)
+        if entry is None:
+            return None
+        name, row_id = entry
+        return {"table": table, "name": name, "id": row_id}
+
+    def _fingerspell(self, letters):
+        signs, missing = [], []
+        for letter in letters.upper():
+            sign = self._sign(TABLE_ALPHABETS, letter)
+            if sign is not None:
+                signs.append(sign)
+            elif letter.isalnum():
+                missing.append(letter)
+        return signs, missing
+
+    def _resolve_token(self, token):
+        word = _PUNCTUATION.sub("", token).upper()
+        if not word:
+            return None
+
+        if word.startswith("FS-"):
+            signs, missing = self._fingerspell(re.sub(r"[^A-Z]", "", word[3:]))
+            return {"type": "fingerspell", "signs": signs, "missing": missing}
+
+        if len(word) == 1 and word.isalpha():
+            sign = self._sign(TABLE_ALPHABETS, word)
+            if sign is not None:
+                return {"type": "letter", "signs": [sign]}
+
+        if word.isdigit():
+            number = str(int(word))
+            sign = self._sign(TABLE_NUMBERS, number)
+            if sign is not None:
+                return {"type": "number", "signs": [sign]}
+            signs = [self._sign(TABLE_NUMBERS, digit) for digit in word]
+            if all(signs):
+                return {"type": "digits", "signs": signs}
+
+        sign = self._sign(TABLE_WORDS, word)
+        if sign is not None:
+            return {"type": "word", "signs": [sign]}
+        for candidate in _lemma_candidates(word):
+            sign = self._sign(TABLE_WORDS, candidate)
+            if sign is not None:
+                return {"type": "lemma", "lemma": candidate, "signs": [sign]}
+
+        signs, missing = self._fingerspell(re.sub(r"[^A-Z0-9]", "", word))
+        if not signs and not missing:
+            return None  # Nothing signable, e.g. a lone symbol
+        return {"type": "fingerspell", "signs": signs, "missing": missing}
+
+    def resolve(self, gloss):
+        """
+        Returns the playback plan for a gloss string:
+        {"steps": [{"token", "type", "signs", ...}], "signs": [unique signs in
+        first-use order], "missing": [tokens or letters with no sign]}.
+        """
+        steps, unique, missing = [], {}, []
+        for token in gloss.split():
+            step = self._memo.get(token)
+            if step is None:
+                step = self._resolve_token(token)
+                if step is None:
+                    continue
+                if len(self._memo) >= _MEMO_SIZE:
+                    self._memo.clear()
+                self._memo[token] = step
+            steps.append({"token": token, **step})
+            for sign in step["signs"]:
+                unique.setdefault((sign["table"], sign["name"]), sign)
+            if step.get("missing"):
+                missing.append(token)
+        return {"steps": steps, "signs": list(unique.values()), "missing": missing}
@@ -0,0 +1,133 @@
+import glob
+import json
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- Checkpointed Gloss Shards ---
+# Gloss synthesis writes its output as it goes: every `shard_size` records
+# become one Parquet file of `(index, asl_gloss)` rows, and a JSON manifest
+# lists the finished shards. Both are written to a temporary name and renamed
+# into place, so a crash leaves at worst one shard to redo; a restart skips
+# every range the manifest already lists. Only one shard's glosses are ever
+# held in memory. `asl_gloss_error` holds the validation failure of a gloss
+# that no retry fixed (null when it is valid or was not validated).
+#
+#   shard_dir/
+#     manifest.json                       {"version", "total_records", "config", "shards": [...]}
+#     shard-00000000-00001024.parquet     index int64, asl_gloss string, asl_gloss_error string
+#
+# Data-parallel runs give every worker its own manifest (manifest-001-of-004.json)
+# over its own index range, so workers never write the same file; the
+# coordinator reads all of them to follow progress and to merge.
+
+MANIFEST_VERSION = 2
+SHARD_SCHEMA = pa.schema([("index", pa.int64()), ("asl_gloss", pa.string()), ("asl_gloss_error", pa.string())])
+
+
+def _write_atomic(path, write):
+    temp_path = path + ".tmp"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+class ShardStore:
+    """
+    Progress of one run in `shard_dir`. `config` (model, dataset, ...) is
+    recorded in the manifest; resuming with a different config or record
+    count raises instead of mixing outputs.
+    """
+
+    def __init__(self, shard_dir, total_records, config, manifest_name="manifest.json"):
+        self.shard_dir = shard_dir
+        self.manifest_path = os.path.join(shard_dir, manifest_name)
+        os.makedirs(shard_dir, exist_ok=True)
+
+        self.manifest = {"version": MANIFEST_VERSION, "total_records": total_records, "config": config, "shards": []}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if (manifest.get("version"), manifest.get("total_records"), manifest.get("config")) != \
+                    (MANIFEST_VERSION, total_records, config):
+                raise ValueError(f"{self.manifest_path} belongs to a different run; remove {shard_dir} to start over")
+            self.manifest = manifest
+
+    @property
+    def shards(self):
+        return self.manifest["shards"]
+
+    def done_records(self):
+        return sum(shard["stop"] - shard["start"] for shard in self.shards)
+
+    def pending_ranges(self, start, stop, shard_size):
+        """`(start, stop)` ranges of at most `shard_size` records in [start, stop) not written yet."""
+        done = {(shard["start"], shard["stop"]) for shard in self.shards}
+        return [(first, min(first + shard_size, stop)) for first in range(start, stop, shard_size)
+                if (first, min(first + shard_size, stop)) not in done]
+
+    def write_shard(self, start, stop, glosses, errors=None, **info):
+        """
+        Writes the glosses (and `errors`, one reason or None per gloss) for
+        records [start, stop) and records the shard, with any extra `info`, in
+        the manifest (replacing an earlier version).
+        """
+        if len(glosses) != stop - start:
+            raise ValueError(f"Shard {start}-{stop} got {len(glosses)} glosses")
+        filename = f"shard-{start:08d}-{stop:08d}.parquet"
+        table = pa.table({"index": pa.array(range(start, stop), pa.int64()), "asl_gloss": pa.array(glosses, pa.string()),
+                          "asl_gloss_error": pa.array(errors or [None] * len(glosses), pa.string())},
+                         schema=SHARD_SCHEMA)
+        _write_atomic(os.path.join(self.shard_dir, filename), lambda path: pq.write_table(table, path))
+
+        self.shards[:] = [shard for shard in self.shards if (shard["start"], shard["stop"]) != (start, stop)]
+        self.shards.append({"start": start, "stop": stop, "file": filename, **info})
+        self.shards.sort(key=lambda shard: shard["start"])
+        _write_atomic(self.manifest_path, lambda path: self._dump_manifest(path))
+
+    def read_glosses(self, shard):
+        return pq.read_table(os.path.join(self.shard_dir, shard["file"]), columns=["asl_gloss"])["asl_gloss"].to_pylist()
+
+    def _dump_manifest(self, path):
+        with open(path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+
+    def shard_paths(self):
+        """The shard files in record order; see `covering_paths`."""
+        return covering_paths(self.shard_dir, self.shards, self.manifest["total_records"])
+
+
+def manifest_name(worker_id=0, num_workers=1):
+    return "manifest.json" if num_workers == 1 else f"manifest-{worker_id:03d}-of-{num_workers:03d}.json"
+
+
+def collect_shards(shard_dir, total_records, config):
+    """
+    The finished shards of every manifest in `shard_dir`, sorted by start.
+    Manifests of a different run raise like `ShardStore` does.
+    """
+    shards = []
+    for path in sorted(glob.glob(os.path.join(shard_dir, "manifest*.json"))):
+        with open(path) as f:
+            manifest = json.load(f)
+        if (manifest.get("version"), manifest.get("total_records"), manifest.get("config")) != \
+                (MANIFEST_VERSION, total_records, config):
+            raise ValueError(f"{path} belongs to a different run; remove {shard_dir} to start over")
+        shards.extend(manifest["shards"])
+    return sorted(shards, key=lambda shard: (shard["start"], shard["stop"]))
+
+
+def covering_paths(shard_dir, shards, total_records):
+    """
+    The files of `shards` (sorted by start) in record order. Raises unless
+    they cover records [0, total_records) exactly once.
+    """
+    expected = 0
+    for shard in shards:
+        if shard["start"] != expected:
+            problem = "overlap" if shard["start"] < expected else "do not cover"
+            raise ValueError(f"Shards {problem} records {min(expected, shard['start'])}-{max(expected, shard['start'])}")
+        expected = shard["stop"]
+    if expected != total_records:
+        raise ValueError(f"Shards cover {expected} of {total_records} records")
+    return [os.path.join(shard_dir, shard["file"]) for shard in shards]
+
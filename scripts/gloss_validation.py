@@ -0,0 +1,75 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# --- Gloss Validation ---
+# Checks generated glosses against the shape the prompt asks for, with
+# pyarrow compute kernels over whole shards at once. A gloss fails with the
+# first matching reason:
+#
+#   parse_failed  empty model output ("ERROR: PARSING FAILED")
+#   multiline     more than one line (explanations, notes, alternatives)
+#   vocabulary    a token that is not gloss: lowercase prose, preamble such as
+#                 "Here is the gloss:", markdown; allowed are uppercase words
+#                 with repetition marks (CRY++), fs-NAME, IX-/POSS-/SELF-
+#                 pointers and trailing punctuation
+#   echo          the English source sentence uppercased instead of glossed:
+#                 a word-for-word copy of at least `echo_min_words` words, or
+#                 one that covers `echo_overlap` of the source words while
+#                 keeping articles or copulas (THE, A, IS, ...), which ASL
+#                 gloss drops
+#   too_long      more than `max_ratio` tokens per source word (plus a little
+#                 slack for short sentences), typically runaway repetition
+#   too_short     fewer than `min_ratio` tokens per source word
+
+PARSE_FAILED = "ERROR: PARSING FAILED"
+_TOKEN = r"(?:fs-[A-Z][A-Z.'-]*|(?:IX|POSS|SELF)-[A-Za-z0-9-]+|#?[A-Z0-9][A-Z0-9'/-]*\+{0,3})[.,?!;:]*"
+_GLOSS = rf"^{_TOKEN}(?: +{_TOKEN})*$"
+ENGLISH_FUNCTION_WORDS = frozenset({"THE", "A", "AN", "IS", "ARE", "WAS", "WERE", "AM", "BE", "BEEN"})
+_FUNCTION_WORD = rf"(?:^| )(?:{'|'.join(sorted(ENGLISH_FUNCTION_WORDS))})(?: |$)"
+
+
+def _words(array, punctuation):
+    """Uppercased words of `array` without `punctuation`, single-space separated."""
+    words = pc.replace_substring_regex(pc.utf8_upper(array), punctuation, " ")
+    return pc.utf8_trim_whitespace(pc.replace_substring_regex(words, r"\s+", " "))
+
+
+def _echoes(texts, glosses, overlap, min_words):
+    source = _words(texts, r"[^\w\s']")  # as normalize_text(text).upper()
+    gloss = _words(glosses, r"[.,?!;:+]")
+    copied = pc.and_(pc.equal(gloss, source), pc.greater_equal(pc.count_substring_regex(source, r"\S+"), min_words))
+    # Token coverage only for the (few) glosses that still have English function words
+    candidates = pc.match_substring_regex(gloss, _FUNCTION_WORD).to_pylist()
+    covering = []
+    for is_candidate, source_text, gloss_text in zip(candidates, source.to_pylist(), gloss.to_pylist()):
+        source_tokens = (source_text or "").split()
+        if not is_candidate or not source_tokens:
+            covering.append(False)
+            continue
+        gloss_tokens = set(gloss_text.split())
+        covering.append(sum(token in gloss_tokens for token in source_tokens) >= overlap * len(source_tokens))
+    return pc.or_(copied, pa.array(covering, pa.bool_()))
+
+
+def validate_glosses(texts, glosses, min_ratio=0.15, max_ratio=1.5, slack_tokens=2, echo_overlap=0.8,
+                     echo_min_words=5):
+    """The failure reason for each gloss (see above), None where it is valid."""
+    texts = pa.array(texts, pa.string())
+    glosses = pc.utf8_trim_whitespace(pa.array(glosses, pa.string()))
+    source_words = pc.count_substring_regex(texts, r"\S+")
+    gloss_tokens = pc.count_substring_regex(glosses, r"\S+")
+
+    checks = [
+        ("parse_failed", pc.or_(pc.equal(glosses, PARSE_FAILED), pc.equal(gloss_tokens, 0))),
+        ("multiline", pc.match_substring(glosses, "\n")),
+        ("vocabulary", pc.invert(pc.match_substring_regex(glosses, _GLOSS))),
+        ("echo", _echoes(texts, glosses, echo_overlap, echo_min_words)),
+        ("too_long", pc.greater(gloss_tokens, pc.add(pc.multiply(source_words, max_ratio), slack_tokens))),
+        ("too_short", pc.less(gloss_tokens, pc.multiply(source_words, min_ratio))),
+    ]
+    reasons = pa.nulls(len(glosses), pa.string())
+    # Later checks go first so the earliest matching reason wins
+    for reason, failed in reversed(checks):
+        reasons = pc.if_else(failed, reason, reasons)
+    return reasons.to_pylist()
+
@@ -0,0 +1,138 @@
+from gemma_inference import do_gemma_3n_batch_inference, stream_gemma_3n_inference
+
+# --- Inference Backends ---
+# The server reaches the model only through a backend, chosen with
+# GEMMA_BACKEND. Every backend loads a `(model, processor)` pair with the
+# Hugging Face `apply_chat_template` / `generate` / `batch_decode` API, so
+# batching, the caches, early stopping and output parsing are shared:
+#
+#   unsloth  the finetuned model through `unsloth.FastModel` (CUDA)
+#   cpu      the merged float16 export (`save_pretrained_merged`) loaded with
+#            transformers on CPU, Linear layers dynamically quantized to int8
+#   stub     the deterministic CPU stub from stub_model.py, for tests and
+#            benchmarks
+#
+# The GGUF export is not served: llama.cpp runs Gemma 3n's text decoder only
+# and cannot encode the audio input.
+
+
+class InferenceBackend:
+    """
+    Base class. Subclasses implement `_load()` returning `(model, tokenizer)`;
+    `load()` must be called before any generation.
+    """
+
+    name = None
+    supports_prefix_cache = True
+
+    def __init__(self, device):
+        self.device = device
+        self.model = None
+        self.tokenizer = None
+
+    def _load(self):
+        raise NotImplementedError
+
+    def load(self):
+        self.model, self.tokenizer = self._load()
+        return self
+
+    def make_prefix_cache(self, max_prefixes):
+        """A `PrefixCache` for this backend's model, or None if it has none or `max_prefixes` is 0."""
+        if not self.supports_prefix_cache or max_prefixes <= 0:
+            return None
+        from prefix_cache import PrefixCache
+        return PrefixCache(self.model, self.tokenizer, self.device, max_prefixes)
+
+    def generate_batch(self, batch_messages, max_new_tokens, streamer=None, prefix_cache=None, stats=None):
+        """Same contract as `do_gemma_3n_batch_inference`."""
+        return do_gemma_3n_batch_inference(
+            self.model, self.tokenizer, batch_messages, max_new_tokens,
+            streamer=streamer, device=self.device, prefix_cache=prefix_cache, stats=stats,
+        )
+
+    def stream(self, messages, max_new_tokens, run=None, prefix_cache=None, stats=None):
+        """Same contract as `stream_gemma_3n_inference`."""
+        return stream_gemma_3n_inference(
+            self.model, self.tokenizer, messages, max_new_tokens,
+            run=run, device=self.device, prefix_cache=prefix_cache, stats=stats,
+        )
+
+
+class UnslothBackend(InferenceBackend):
+    name = "unsloth"
+
+    def __init__(self, device, model_name="gemma-3n", max_seq_length=1024):
+        super().__init__(device)
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+
+    def _load(self):
+        from unsloth import FastModel
+        # Load the model with 4-bit quantization
+        return FastModel.from_pretrained(
+            model_name=self.model_name,
+            dtype=None,  # Auto-detection
+            max_seq_length=self.max_seq_length,
+#            load_in_4bit=True,
+#            full_finetuning=False,
+        )
+
+
+class CpuQuantizedBackend(InferenceBackend):
+    """
+    Loads the merged export with transformers in float32 on CPU and, with
+    `quantization="int8"`, replaces its Linear layers with dynamically
+    quantized int8 ones (weights stored in int8, activations quantized per
+    batch).
+    """
+
+    name = "cpu"
+
+    def __init__(self, device="cpu", model_path="gemma-3n", quantization="int8", threads=0):
+        super().__init__("cpu")
+        self.model_path = model_path
+        self.quantization = quantization
+        self.threads = threads
+
+    def _load(self):
+        import torch
+        from transformers import AutoModelForImageTextToText, AutoProcessor
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        processor = AutoProcessor.from_pretrained(self.model_path)
+        model = AutoModelForImageTextToText.from_pretrained(self.model_path, torch_dtype=torch.float32)
+        model.eval()
+        if self.quantization == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif self.quantization != "none":
+            raise ValueError(f"Unsupported CPU quantization: {self.quantization}")
+        return model, processor
+
+
+class StubBackend(InferenceBackend):
+    """The CPU stub model; `per_token_delay_s` and `prefill_delay_s` stand in for GPU time."""
+
+    name = "stub"
+
+    def __init__(self, device="cpu", per_token_delay_s=0.005, prefill_delay_s=0.0):
+        super().__init__("cpu")
+        self.per_token_delay_s = per_token_delay_s
+        self.prefill_delay_s = prefill_delay_s
+
+    def _load(self):
+        from stub_model import load_stub_model
+        return load_stub_model(per_token_delay_s=self.per_token_delay_s, prefill_delay_s=self.prefill_delay_s)
+
+
+BACKENDS = {backend.name: backend for backend in (UnslothBackend, CpuQuantizedBackend, StubBackend)}
+
+
+def create_backend(name, device, **options):
+    """Instantiates the backend registered under `name` (not loaded yet)."""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend {name!r}; choose one of {', '.join(BACKENDS)}") from None
+    return backend_class(device, **options)
@@ -0,0 +1,208 @@
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# --- Micro-Batching Scheduler ---
+# All model work runs on one dedicated worker thread. Concurrent /transcribe
+# calls are put on a bounded admission queue; the worker takes the first waiting
+# request, keeps collecting more for up to `max_wait_ms` (or until
+# `max_batch_size` is reached) and runs them all through one `generate`.
+#
+# Jobs that cannot be batched (a streamed generation) are submitted as
+# `exclusive` callables and run on the same thread on their own.
+#
+# Before any GPU time is spent on a job, it is dropped if its deadline has passed
+# or its client has disconnected.
+
+
+class QueueFullError(RuntimeError):
+    """Raised by `submit` when the admission queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(TimeoutError):
+    """Set on a job whose deadline passed before it could run."""
+
+
+class ClientDisconnectedError(ConnectionError):
+    """Set on a job whose client went away before it could run."""
+
+
+class _Job:
+    __slots__ = ("payload", "future", "deadline", "is_alive", "exclusive")
+
+    def __init__(self, payload, future, deadline, is_alive, exclusive):
+        self.payload = payload
+        self.future = future
+        self.deadline = deadline
+        self.is_alive = is_alive
+        self.exclusive = exclusive
+
+
+class MicroBatchScheduler:
+    """
+    Groups concurrent requests into batches for `run_batch`.
+
+    `run_batch` receives a list of request payloads and must return a list of
+    results of the same length and order. Each caller of `submit` gets back only
+    the result for its own payload.
+
+    `max_queue_size` bounds how many jobs may wait (0 means unbounded); beyond
+    that `submit` fails fast with `QueueFullError`.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=10.0, max_queue_size=0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._carry = None
+        self._worker = None
+        self._stopping = threading.Event()
+        self._avg_batch_s = None
+        self.dropped_deadline = 0
+        self.dropped_disconnected = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._worker is None:
+            self._stopping.clear()
+            self._worker = threading.Thread(target=self._run, name="inference-worker", daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self):
+        if self._worker is not None:
+            self._stopping.set()
+            self._queue.put(None)  # Wake the worker up
+            self._worker.join()
+            self._worker = None
+
+    def depth(self):
+        """Number of jobs waiting to run."""
+        return self._queue.qsize() + (1 if self._carry is not None else 0)
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, estimated from recent batch times."""
+        batch_s = self._avg_batch_s or 1.0
+        return max(1, math.ceil(batch_s * max(1, self.depth() / self.max_batch_size)))
+
+    def submit_async(self, payload, deadline=None, is_alive=None, exclusive=False):
+        """
+        Queues a payload and returns a Future for its result.
+
+        - `deadline`: a `time.monotonic()` value after which the job is dropped.
+        - `is_alive`: a callable returning False once the client has disconnected.
+        - `exclusive`: `payload` is a zero-argument callable run on its own.
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait(_Job(payload, future, deadline, is_alive, exclusive))
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after()) from None
+        return future
+
+    def submit(self, payload, timeout=None):
+        """Queues a payload and blocks until its result is ready."""
+        return self.submit_async(payload).result(timeout=timeout)
+
+    def _collect_batch(self):
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is None:
+            return []
+        if first.exclusive:
+            return [first]
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                self._stopping.set()
+                break
+            if job.exclusive:
+                self._carry = job
+                break
+            batch.append(job)
+        return batch
+
+    def _admit(self, job):
+        """Marks a job as running, or fails it if it should no longer run."""
+        if not job.future.set_running_or_notify_cancel():
+            return False
+        if job.deadline is not None and time.monotonic() > job.deadline:
+            self.dropped_deadline += 1
+            job.future.set_exception(DeadlineExceededError("Request deadline passed while queued"))
+            return False
+        if job.is_alive is not None and not job.is_alive():
+            self.dropped_disconnected += 1
+            job.future.set_exception(ClientDisconnectedError("Client disconnected while queued"))
+            return False
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set() or self._carry is not None:
+            batch = [job for job in self._collect_batch() if self._admit(job)]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            try:
+                if batch[0].exclusive:
+                    results = [batch[0].payload()]
+                else:
+                    results = self.run_batch([job.payload for job in batch])
+            except Exception as e:
+                for job in batch:
+                    job.future.set_exception(e)
+                continue
+
+            elapsed = time.monotonic() - started
+            self._avg_batch_s = elapsed if self._avg_batch_s is None else 0.8 * self._avg_batch_s + 0.2 * elapsed
+
+            for job, result in zip(batch, results):
+                job.future.set_result(result)
+
+
+# --- Throughput Check ---
+# Runs the scheduler against the stub model on CPU:
+#   python inference_scheduler.py
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+    from gemma_inference import build_messages, do_gemma_3n_batch_inference, parse_asl_response
+    from stub_model import load_stub_model
+
+    model, tokenizer = load_stub_model(per_token_delay_s=0.005)
+    requests_per_level = 32
+
+    def run_batch(batch_messages):
+        return [parse_asl_response(text) for text in do_gemma_3n_batch_inference(model, tokenizer, batch_messages, device="cpu")]
+
+    for max_batch_size in (1, 8):
+        scheduler = MicroBatchScheduler(run_batch, max_batch_size=max_batch_size, max_wait_ms=10).start()
+        for concurrency in (1, 4, 8, 16):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(
+                    lambda _: scheduler.submit(build_messages("speech.wav", "Please transcribe this audio.")),
+                    range(requests_per_level),
+                ))
+            elapsed = time.perf_counter() - start
+            print(f"max_batch_size={max_batch_size:2d} concurrency={concurrency:2d} "
+                  f"throughput={requests_per_level / elapsed:6.1f} req/s")
+        scheduler.stop()
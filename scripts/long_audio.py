@@ -0,0 +1,73 @@
+import math
+import re
+from audio_io import TARGET_SAMPLE_RATE
+
+# --- Long-Audio Chunking ---
+# The model is finetuned on short utterances and MAX_SEQ_LENGTH bounds the
+# prompt, so long recordings are split into overlapping windows that run as one
+# batch. Each window is transcribed on its own; neighbouring transcripts repeat
+# the words spoken in the overlap, which are matched up and kept only once.
+#
+# Only a run that ends the previous transcript and starts the next one (give or
+# take `edge_words` garbled words where a window edge cut a word in half) and
+# fits in the overlap counts as the repeated region. Matches anywhere else are
+# genuinely repeated speech and are kept.
+
+
+def split_windows(audio, window_s=30.0, overlap_s=4.0, sample_rate=TARGET_SAMPLE_RATE):
+    """
+    Splits `audio` into windows of `window_s` seconds that overlap by
+    `overlap_s`. The windows are views into `audio`; the last one may be
+    shorter. Audio that fits in one window comes back as a single window.
+    """
+    window = int(window_s * sample_rate)
+    overlap = int(overlap_s * sample_rate)
+    if window <= overlap:
+        raise ValueError("window_s must be longer than overlap_s")
+    step = window - overlap
+    return [audio[start:start + window] for start in range(0, max(len(audio) - overlap, 1), step)]
+
+
+def _normalize_word(word):
+    return re.sub(r"[^\w'-]", "", word.lower())
+
+
+def merge_overlapping(previous, following, max_overlap_words=12, min_match_words=2, edge_words=1):
+    """
+    Joins two word lists whose boundary regions cover the same audio. The
+    longest run of matching words (ignoring case and punctuation) that ends
+    within `edge_words` of the end of `previous` and starts within
+    `edge_words` of the start of `following`, at most `max_overlap_words`
+    long, is kept once along with the words outside it; without such a run of
+    `min_match_words` the lists are simply concatenated.
+    """
+    tail = [_normalize_word(word) for word in previous[-(max_overlap_words + edge_words):]]
+    head = [_normalize_word(word) for word in following[:max_overlap_words + edge_words]]
+    for size in range(min(max_overlap_words, len(tail), len(head)), min_match_words - 1, -1):
+        for dropped_tail in range(min(edge_words, len(tail) - size) + 1):
+            end = len(tail) - dropped_tail
+            for start in range(min(edge_words, len(head) - size) + 1):
+                if tail[end - size:end] == head[start:start + size]:
+                    return previous[:len(previous) - dropped_tail] + following[start + size:]
+    return previous + following
+
+
+def overlap_words(words, overlap_fraction, max_overlap_words=12):
+    """Words of a `words`-word window that can fall in an `overlap_fraction` overlap (at least one)."""
+    return max(1, min(max_overlap_words, math.ceil(words * overlap_fraction)))
+
+
+def stitch_transcripts(results, overlap_fraction=1.0, max_overlap_words=12, min_match_words=2):
+    """
+    Merges per-window `{"text", "asl_gloss"}` results, in window order, into
+    one. `overlap_fraction` (overlap / window length) bounds how many words of
+    each window can be a repeat of the previous one.
+    """
+    text, gloss = [], []
+    for result in results:
+        words, signs = result["text"].split(), result["asl_gloss"].split()
+        text = merge_overlapping(text, words, overlap_words(len(words), overlap_fraction, max_overlap_words),
+                                 min_match_words)
+        gloss = merge_overlapping(gloss, signs, overlap_words(len(signs), overlap_fraction, max_overlap_words),
+                                  min_match_words)
+    return {"text": " ".join(text), "asl_gloss": " ".join(gloss)}
@@ -0,0 +1,79 @@
+import gc
+import torch
+
+# --- Device & Memory Management ---
+# Calling `torch.cuda.empty_cache()` and `gc.collect()` after every request makes
+# the caching allocator hand memory back to the driver only to request it again
+# on the next call, and a full GC pass adds tail latency. The policy below keeps
+# the cache warm and only reclaims once reserved memory crosses a high-water
+# mark, or every N requests if that is configured.
+
+
+def resolve_device(preferred=None):
+    """
+    Returns the device name inputs should be moved to. `preferred` may be
+    "cuda", "cuda:1", "cpu", ... or None/"auto" to pick CUDA when it is present.
+    """
+    if preferred and preferred != "auto":
+        return preferred
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def allocator_stats(device):
+    """Current allocator numbers in bytes, or an empty dict off-GPU."""
+    if not str(device).startswith("cuda") or not torch.cuda.is_available():
+        return {}
+    return {
+        "allocated": torch.cuda.memory_allocated(device),
+        "reserved": torch.cuda.memory_reserved(device),
+        "max_reserved": torch.cuda.max_memory_reserved(device),
+        "total": torch.cuda.get_device_properties(device).total_memory,
+    }
+
+
+class MemoryPolicy:
+    """
+    Decides after each generation whether to give cached memory back.
+
+    - `high_water_fraction`: reclaim when reserved memory exceeds this fraction
+      of the device's total memory (None disables the check).
+    - `reclaim_every`: reclaim after this many requests (0 disables it).
+    """
+
+    def __init__(self, device, high_water_fraction=0.9, reclaim_every=0):
+        self.device = device
+        self.high_water_fraction = high_water_fraction
+        self.reclaim_every = reclaim_every
+        self.requests_since_reclaim = 0
+        self.reclaim_count = 0
+        self.last_reclaim = None
+
+    def _reason(self, stats):
+        if self.reclaim_every and self.requests_since_reclaim >= self.reclaim_every:
+            return f"{self.requests_since_reclaim} requests since last reclaim"
+        if self.high_water_fraction is not None and stats:
+            high_water = self.high_water_fraction * stats["total"]
+            if stats["reserved"] > high_water:
+                return f"reserved {stats['reserved'] / 2**30:.2f} GiB > high-water {high_water / 2**30:.2f} GiB"
+        return None
+
+    def after_inference(self, num_requests=1):
+        """
+        Records `num_requests` finished requests and reclaims memory if the
+        policy says so. Returns a report of the stats acted on, or None.
+        """
+        self.requests_since_reclaim += num_requests
+        before = allocator_stats(self.device)
+        reason = self._reason(before)
+        if reason is None:
+            return None
+
+        gc.collect()
+        if before:
+            torch.cuda.empty_cache()
+        after = allocator_stats(self.device)
+
+        self.requests_since_reclaim = 0
+        self.reclaim_count += 1
+        self.last_reclaim = {"reason": reason, "before": before, "after": after}
+        return self.last_reclaim
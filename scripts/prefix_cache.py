@@ -0,0 +1,168 @@
+import copy
+import threading
+from collections import OrderedDict
+import torch
+
+# --- Prompt-Prefix KV Cache ---
+# Every request starts with the same tokens: the fixed system turn and the
+# opening of the user turn, up to the first audio token. Those are prefilled
+# once and their past-key-values kept; each request then starts from a copy and
+# only prefills its own audio and prompt text.
+#
+# The user turn puts the audio before the prompt text (the order the model was
+# finetuned on), so the prompt itself comes after the audio and cannot be part
+# of the shared prefix. Prefixes are stored per distinct token sequence, which
+# gives one entry per system turn / template, bounded by `max_prefixes`.
+#
+# A batch reuses the prefix when no row is padded, so the prefix sits at
+# positions 0..n in every row; that is the common case, since every clip
+# becomes the same number of audio tokens and most requests use the default
+# prompt. The stored single-row past-key-values are then copied tensor by
+# tensor with the row repeated across the batch. Batches whose rows differ in
+# length (left padding shifts the prefix per row) are prefilled in full.
+
+
+def audio_start_token_ids(tokenizer):
+    """Token ids that can open an audio segment (begin-of-audio / audio soft token)."""
+    ids = set()
+    for owner in (tokenizer, getattr(tokenizer, "tokenizer", None)):
+        for name in ("boa_token_id", "audio_token_id"):
+            token_id = getattr(owner, name, None)
+            if isinstance(token_id, int):
+                ids.add(token_id)
+    return ids
+
+
+def _as_list(row):
+    return row.tolist() if hasattr(row, "tolist") else list(row)
+
+
+def _expand(value, batch_size):
+    """
+    Copy of a past-key-values object whose key/value tensors (batch, heads,
+    seq, dim) hold their single row `batch_size` times. Only the tensors are
+    copied; the cache objects around them are rebuilt with `copy.copy`.
+    """
+    if isinstance(value, torch.Tensor):
+        return value.repeat(batch_size, 1, 1, 1) if value.dim() == 4 else value.clone()
+    if isinstance(value, (list, tuple)):
+        return type(value)(_expand(item, batch_size) for item in value)
+    if isinstance(value, dict):
+        return {key: _expand(item, batch_size) for key, item in value.items()}
+    if type(value).__module__.startswith("transformers.cache_utils"):
+        clone = copy.copy(value)
+        for name, attribute in vars(value).items():
+            setattr(clone, name, _expand(attribute, batch_size))
+        return clone
+    return value
+
+
+class PrefixCache:
+    """
+    Keeps prefilled past-key-values for shared prompt prefixes, least recently
+    used first out. Inputs reuse a prefix when every row starts with it
+    unpadded: in a left-padded batch it starts at a different position in
+    every row.
+    """
+
+    def __init__(self, model, tokenizer, device, max_prefixes=4):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_prefixes = max_prefixes
+        self.hits = 0
+        self.misses = 0
+        self._audio_ids = audio_start_token_ids(tokenizer)
+        self._entries = OrderedDict()  # prefix token ids -> past_key_values
+        self._lock = threading.Lock()
+
+    def _prefix_length(self, ids):
+        for index, token_id in enumerate(ids):
+            if token_id in self._audio_ids:
+                return index
+        return 0
+
+    def _build(self, input_ids, prefix_length):
+        with torch.inference_mode():
+            outputs = self.model(
+                input_ids=input_ids[:, :prefix_length],
+                use_cache=True,
+            )
+        return outputs.past_key_values
+
+    def _lookup(self, input_ids, prefix_length, key):
+        with self._lock:
+            past_key_values = self._entries.get(key)
+            if past_key_values is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return past_key_values
+
+        past_key_values = self._build(input_ids, prefix_length)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = past_key_values
+            while len(self._entries) > self.max_prefixes:
+                self._entries.popitem(last=False)
+        return past_key_values
+
+    def warm(self, messages):
+        """Prefills the prefix of `messages` ahead of the first request."""
+        inputs = self.tokenizer.apply_chat_template(
+            messages,
+            add_generation_prompt=True,
+            tokenize=True,
+            return_dict=True,
+            return_tensors="pt",
+        ).to(self.device)
+        self.prefill(inputs)
+
+    def prefill(self, inputs):
+        """
+        Returns past-key-values covering every input token but the last, built
+        from the cached prefix plus a prefill of the rest of the prompt (audio
+        included), or None if these inputs cannot use a prefix.
+
+        `generate` then only has to run the final prompt token, so the audio
+        features are consumed here rather than on its first step.
+        """
+        input_ids = inputs["input_ids"]
+        ids = _as_list(input_ids[0])
+        prefix_length = self._prefix_length(ids)
+        if prefix_length == 0 or prefix_length >= len(ids) - 1:
+            return None
+
+        key = tuple(ids[:prefix_length])
+        rows = [_as_list(row) for row in input_ids]
+        if len(rows) > 1:
+            unpadded = all(all(_as_list(mask)[:prefix_length]) for mask in inputs["attention_mask"])
+            if not unpadded or any(tuple(row[:prefix_length]) != key for row in rows[1:]):
+                return None
+        past_key_values = self._lookup(input_ids[:1], prefix_length, key)
+        if type(past_key_values).__module__.startswith("transformers") or isinstance(past_key_values, tuple):
+            past_key_values = _expand(past_key_values, len(rows))
+        else:
+            past_key_values = copy.deepcopy(past_key_values)  # e.g. stub_model.StubCache
+
+        end = len(ids) - 1
+        extra = {
+            name: value for name, value in inputs.items()
+            if name not in ("input_ids", "attention_mask", "token_type_ids")
+        }
+        if "token_type_ids" in inputs:
+            extra["token_type_ids"] = inputs["token_type_ids"][:, prefix_length:end]
+
+        with torch.inference_mode():
+            outputs = self.model(
+                input_ids=input_ids[:, prefix_length:end],
+                attention_mask=inputs["attention_mask"][:, :end],
+                past_key_values=past_key_values,
+                cache_position=torch.arange(prefix_length, end, device=self.device),
+                use_cache=True,
+                **extra,
+            )
+        return outputs.past_key_values
+
+    def stats(self):
+        with self._lock:
+            return {"prefixes": len(self._entries), "hits": self.hits, "misses": self.misses}
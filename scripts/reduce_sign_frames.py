@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from build_sign_database import TABLES, list_signs
+from frame_codec import HAND_LANDMARKS, KIND_HAND, KIND_POSE, POSE_LANDMARKS, FrameArrays
+
+# --- Sign Animation Frame Reduction ---
+# The WLASL landmarks keep the source video's frame rate and its idle frames
+# before and after the sign. This stage rewrites each sign's pose and hand JSON:
+#
+#   1. trim    drop the motionless lead-in and lead-out: frames before the arms
+#              and hands first move faster than `motion_threshold` (image
+#              widths per second) and after they last do, keeping `pad_s`
+#   2. resample  interpolate every landmark onto a uniform `target_fps` grid
+#   3. reduce  with `tolerance` > 0, drop frames that linear interpolation
+#              between the kept neighbours reproduces within `tolerance`
+#
+# Pose and hand frames are processed together so they keep matching
+# frame_index values. Output frame_index values count target-fps frames from 0,
+# so frames dropped by step 3 leave gaps. The app plays one frame every 33 ms
+# whatever the frame_index, so keep the default target of 30 fps, and leave the
+# tolerance at 0 unless the player interpolates over frame_index gaps.
+#
+# WLASL videos do not share one frame rate, so each sign's source rate is taken
+# from, in order: an `fps` field in its pose JSON, the `--fps-map` file (either
+# {"name" or "table/name": fps} or the WLASL_v*.json metadata, whose per-gloss
+# instance fps is used when all instances agree), and only then the uniform
+# `--source-fps`. The report records the rate and where it came from; signs on
+# the uniform fallback are resampled as if recorded at that rate.
+#
+#   python reduce_sign_frames.py assets/signs reduced/signs --fps-map WLASL_v0.3.json --report report.json
+
+# Arm landmarks (elbows down to the fingertips) and both hands drive the motion measure
+_MOTION_SLOTS = np.r_[POSE_LANDMARKS.index("LEFT_ELBOW"):POSE_LANDMARKS.index("RIGHT_THUMB") + 1,
+                      len(POSE_LANDMARKS):len(POSE_LANDMARKS) + 2 * len(HAND_LANDMARKS)]
+
+
+def _align(pose, hand):
+    """Hand coordinates on the pose frames' timeline, the way the app joins them."""
+    rows = {int(index): row for row, index in enumerate(hand.frame_index)}
+    aligned = np.full((len(pose.frame_index), hand.coords.shape[1], 3), np.nan, dtype=np.float32)
+    for row, index in enumerate(pose.frame_index):
+        if int(index) in rows:
+            aligned[row] = hand.coords[rows[int(index)]]
+    return np.concatenate([pose.coords, aligned], axis=1)
+
+
+def motion_speed(coords, times):
+    """Per-frame speed of the arm and hand landmarks (mean over the tracked ones); 0 for the first frame."""
+    points = coords[:, _MOTION_SLOTS, :2]
+    distance = np.linalg.norm(np.diff(points, axis=0), axis=2)
+    with np.errstate(invalid="ignore"):
+        # A hand appearing or disappearing counts as movement
+        appeared = np.isnan(points[:-1, :, 0]) != np.isnan(points[1:, :, 0])
+        distance = np.where(appeared, np.inf, distance)
+        tracked = ~np.isnan(distance)
+        mean = np.where(tracked.any(axis=1), np.nansum(distance, axis=1) / np.maximum(tracked.sum(axis=1), 1), 0.0)
+    return np.concatenate([[0.0], mean / np.maximum(np.diff(times), 1e-6)])
+
+
+def trim_motionless(coords, times, motion_threshold=0.05, pad_s=0.1):
+    """`(start, stop)` row range without the still lead-in/lead-out; everything if nothing moves."""
+    moving = np.flatnonzero(motion_speed(coords, times) > motion_threshold)
+    if len(moving) == 0:
+        return 0, len(times)
+    start = np.searchsorted(times, times[max(moving[0] - 1, 0)] - pad_s, side="left")
+    stop = np.searchsorted(times, times[moving[-1]] + pad_s, side="right")
+    return int(start), int(stop)
+
+
+def resample(coords, times, target_fps):
+    """
+    Linearly interpolates `coords` onto `target_fps` frames from `times[0]`.
+    A landmark missing on one side takes the nearer frame's value, or stays
+    missing if that frame lacks it too.
+    """
+    if len(times) < 2:
+        return coords.copy(), times.copy()
+    grid = np.arange(times[0], times[-1] + 0.5 / target_fps, 1 / target_fps)
+    left = np.clip(np.searchsorted(times, grid, side="right") - 1, 0, len(times) - 2)
+    weight = np.clip((grid - times[left]) / (times[left + 1] - times[left]), 0, 1)[:, None, None]
+    before, after = coords[left], coords[left + 1]
+    blended = before * (1 - weight) + after * weight
+    nearest = np.where(weight < 0.5, before, after)
+    return np.where(np.isnan(blended), nearest, blended).astype(np.float32), grid
+
+
+def reduce_keyframes(coords, times, tolerance):
+    """
+    Indices of the frames to keep so that linear interpolation over `times`
+    reproduces every dropped frame within `tolerance` (per coordinate). A
+    frame where a landmark appears or disappears is always kept.
+    """
+    present = ~np.isnan(coords[:, :, 0])
+    kept, anchor = [0], 0
+    while anchor < len(times) - 1:
+        end = anchor + 1
+        while end + 1 < len(times):
+            candidate = end + 1
+            if not (present[anchor:candidate + 1] == present[anchor]).all():
+                break
+            weight = ((times[anchor + 1:candidate] - times[anchor]) / (times[candidate] - times[anchor]))[:, None, None]
+            interpolated = coords[anchor] * (1 - weight) + coords[candidate] * weight
+            if np.nanmax(np.abs(interpolated - coords[anchor + 1:candidate]), initial=0) > tolerance:
+                break
+            end = candidate
+        kept.append(end)
+        anchor = end
+    return np.array(kept)
+
+
+def reduce_sign(pose_json, hand_json, source_fps=30.0, target_fps=30.0, tolerance=0.0,
+                motion_threshold=0.05, pad_s=0.1, decimals=6):
+    """Returns the reduced `(pose_json, hand_json)` documents."""
+    pose = FrameArrays.from_json(pose_json, KIND_POSE)
+    hand = FrameArrays.from_json(hand_json, KIND_HAND)
+    order = np.argsort(pose.frame_index, kind="stable")
+    pose = FrameArrays(KIND_POSE, pose.frame_index[order], pose.coords[order])
+    coords = _align(pose, hand)
+    times = (pose.frame_index - (pose.frame_index[0] if len(order) else 0)) / source_fps
+
+    start, stop = trim_motionless(coords, times, motion_threshold, pad_s) if len(times) > 1 else (0, len(times))
+    coords, times = resample(coords[start:stop], times[start:stop] - (times[start] if stop > start else 0), target_fps)
+    if tolerance > 0 and len(times) > 2:
+        kept = reduce_keyframes(coords, times, tolerance)
+        coords, times = coords[kept], times[kept]
+
+    frame_index = np.round(times * target_fps).astype(np.int32)
+    split = len(POSE_LANDMARKS)
+    return (FrameArrays(KIND_POSE, frame_index, coords[:, :split]).to_json(decimals),
+            FrameArrays(KIND_HAND, frame_index, coords[:, split:]).to_json(decimals))
+
+
+def load_fps_map(path):
+    """
+    `{name: fps}` from a JSON file that is either such a mapping or the WLASL
+    metadata list (`[{"gloss", "instances": [{"fps", ...}]}]`). A gloss whose
+    instances disagree on fps is left out, since the extracted video is unknown.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return {str(name): float(fps) for name, fps in data.items()}
+    fps_map = {}
+    for entry in data:
+        rates = {instance["fps"] for instance in entry.get("instances", ()) if instance.get("fps")}
+        if len(rates) == 1:
+            fps_map[entry["gloss"]] = float(rates.pop())
+    return fps_map
+
+
+def _process(job):
+    table, (name, pose_path, hand_path), output_dir, options, mapped_fps = job
+    try:
+        with open(pose_path) as f:
+            pose_text = f.read()
+        with open(hand_path) as f:
+            hand_text = f.read()
+        pose_json, hand_json = json.loads(pose_text), json.loads(hand_text)
+        if pose_json.get("fps"):
+            options, fps_from = {**options, "source_fps": float(pose_json["fps"])}, "json"
+        elif mapped_fps:
+            options, fps_from = {**options, "source_fps": mapped_fps}, "map"
+        else:
+            fps_from = "default"
+        reduced_pose, reduced_hand = reduce_sign(pose_json, hand_json, **options)
+    except (OSError, ValueError, KeyError) as e:
+        return {"table": table, "name": name, "error": str(e)}
+
+    outputs = []
+    for source_path, document in ((pose_path, reduced_pose), (hand_path, reduced_hand)):
+        kind_dir = os.path.basename(os.path.dirname(source_path))
+        target_path = os.path.join(output_dir, table, kind_dir, os.path.basename(source_path))
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        text = json.dumps(document, separators=(",", ":"))
+        with open(target_path, "w") as f:
+            f.write(text)
+        outputs.append(text)
+
+    source_fps = options["source_fps"]
+    frames_in = len(pose_json["frames"])
+    frames_out = len(reduced_pose["frames"])
+    return {
+        "table": table,
+        "name": name,
+        "source_fps": source_fps,
+        "fps_from": fps_from,
+        "frames_in": frames_in,
+        "frames_out": frames_out,
+        "duration_in_s": round(frames_in / source_fps, 3),
+        "duration_out_s": round((reduced_pose["frames"][-1]["frame_index"] + 1) / options["target_fps"], 3)
+        if frames_out else 0.0,
+        "bytes_in": len(pose_text.encode()) + len(hand_text.encode()),
+        "bytes_out": sum(len(text.encode()) for text in outputs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trim, resample and keyframe-reduce sign animations")
+    parser.add_argument("signs_dir", help="The assets/signs directory")
+    parser.add_argument("output_dir", help="Where to write the reduced assets (same layout)")
+    parser.add_argument("--source-fps", type=float, default=30.0,
+                        help="Frame rate assumed for signs without an fps field or --fps-map entry")
+    parser.add_argument("--fps-map", help="JSON {name or table/name: fps}, or the WLASL_v*.json metadata")
+    parser.add_argument("--target-fps", type=float, default=30.0, help="The app plays 30 fps (33 ms per frame)")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Max interpolation error of dropped frames, in image widths (0 keeps every frame)")
+    parser.add_argument("--motion-threshold", type=float, default=0.05, help="Image widths per second")
+    parser.add_argument("--pad-s", type=float, default=0.1, help="Still time kept before and after the motion")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--report", help="Write the per-sign report to this JSON file")
+    args = parser.parse_args()
+
+    options = {"source_fps": args.source_fps, "target_fps": args.target_fps, "tolerance": args.tolerance,
+               "motion_threshold": args.motion_threshold, "pad_s": args.pad_s}
+    fps_map = load_fps_map(args.fps_map) if args.fps_map else {}
+    jobs = [(table, sign, args.output_dir, options, fps_map.get(f"{table}/{sign[0]}", fps_map.get(sign[0])))
+            for table in TABLES for sign in list_signs(args.signs_dir, table)]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        rows = list(pool.map(_process, jobs, chunksize=8))
+    elapsed = time.perf_counter() - started
+
+    done = [row for row in rows if "error" not in row]
+    print(f"{'sign':<28} {'frames':>13} {'seconds':>13} {'KiB':>15}")
+    for row in done:
+        print(f"{row['table'] + '/' + row['name']:<28} {row['frames_in']:5d} -> {row['frames_out']:4d} "
+              f"{row['duration_in_s']:5.2f} -> {row['duration_out_s']:5.2f} "
+              f"{row['bytes_in'] / 1024:6.0f} -> {row['bytes_out'] / 1024:5.0f}")
+    for row in rows:
+        if "error" in row:
+            print(f"skipped {row['table']}/{row['name']}: {row['error']}")
+    if done:
+        frames_in = sum(row["frames_in"] for row in done)
+        frames_out = sum(row["frames_out"] for row in done)
+        bytes_in = sum(row["bytes_in"] for row in done)
+        bytes_out = sum(row["bytes_out"] for row in done)
+        print(f"{len(done)} signs in {elapsed:.1f}s: frames {frames_in} -> {frames_out} "
+              f"({frames_out / max(frames_in, 1):.0%}), size {bytes_in / 2**20:.1f} -> {bytes_out / 2**20:.1f} MiB "
+              f"({bytes_out / max(bytes_in, 1):.0%})")
+        assumed = sum(1 for row in done if row["fps_from"] == "default")
+        if assumed:
+            print(f"{assumed} signs had no known frame rate and were assumed to be {args.source_fps:g} fps")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"options": options, "signs": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
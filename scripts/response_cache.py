@@ -0,0 +1,162 @@
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# --- Response Cache ---
+# Short utterances (greetings, yes/no, numbers) repeat constantly. A hit returns
+# the stored {"text", "asl_gloss"} JSON without touching the model.
+#
+# Keys are content addressed: a hash of the decoded audio after peak
+# normalization and int16 quantization (so the same clip at a different gain or
+# container format maps to the same key), the prompt and the generation params
+# (which include the backend and model, so a different checkpoint misses).
+#
+# Hits only reorder the in-memory LRU; their last-used times reach SQLite in
+# batches (every RECENCY_FLUSH_EVERY hits, alongside the next put, or on
+# `flush()`), so a hit never waits for a disk commit under the lock.
+
+RECENCY_FLUSH_EVERY = 256
+
+
+def audio_fingerprint(audio):
+    """Hashes a float32 audio array after peak normalization."""
+    peak = float(np.max(np.abs(audio))) if len(audio) else 0.0
+    scale = 32767.0 / peak if peak > 0 else 0.0
+    quantized = np.round(audio * scale).astype("<i2")
+    return hashlib.blake2b(quantized.tobytes(), digest_size=16).hexdigest()
+
+
+def make_cache_key(audio, prompt, generation_params):
+    """Builds the cache key for one request."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(audio_fingerprint(audio).encode())
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(generation_params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache bounded by the total size of its entries in bytes.
+    With `persist_path`, entries are also written to a SQLite file and the most
+    recently used ones are loaded back at startup.
+    """
+
+    def __init__(self, max_bytes=16 * 2**20, persist_path=None):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._touched = {}  # key -> last hit time, not yet written to SQLite
+
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._load()
+
+    @staticmethod
+    def _entry_size(key, payload):
+        return len(key) + len(payload)
+
+    def _load(self):
+        rows = self._db.execute("SELECT key, value FROM responses ORDER BY last_used DESC").fetchall()
+        loaded = []
+        budget = self.max_bytes
+        for key, payload in rows:
+            size = self._entry_size(key, payload)
+            if size > budget:
+                break
+            budget -= size
+            loaded.append((key, json.loads(payload), size))
+        # Oldest first so the most recently used entry ends up last in LRU order
+        for key, value, size in reversed(loaded):
+            self._entries[key] = (value, size)
+            self._bytes += size
+        stale = [key for key, _ in rows[len(loaded):]]
+        if stale:
+            self._db.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in stale])
+            self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if self._db is not None:
+                self._touched[key] = time.time()
+                if len(self._touched) >= RECENCY_FLUSH_EVERY:
+                    self._write_touched()
+                    self._db.commit()
+            return dict(entry[0])
+
+    def _write_touched(self):
+        self._db.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                             [(used, key) for key, used in self._touched.items()])
+        self._touched.clear()
+
+    def flush(self):
+        """Writes pending last-used times to the SQLite file."""
+        with self._lock:
+            if self._db is not None and self._touched:
+                self._write_touched()
+                self._db.commit()
+
+    def put(self, key, value):
+        payload = json.dumps(value)
+        size = self._entry_size(key, payload)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (dict(value), size)
+            self._bytes += size
+
+            evicted = []
+            while self._bytes > self.max_bytes:
+                old_key, (_, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+                evicted.append((old_key,))
+                self._touched.pop(old_key, None)
+
+            if self._db is not None:
+                self._touched.pop(key, None)
+                self._write_touched()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, last_used) VALUES (?, ?, ?)",
+                    (key, payload, time.time()),
+                )
+                self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
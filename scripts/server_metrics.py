@@ -0,0 +1,180 @@
+import json
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+# --- Server Metrics ---
+# Per-request stage timings and Prometheus metrics for the /metrics endpoint.
+#
+# Stages of a /transcribe request, in order:
+#   receive       reading the upload from the request
+#   decode_audio  decoding it into a 16 kHz float32 array
+#   preprocess    silence trimming and loudness normalization
+#   queue         waiting in the admission queue / for the batch to fill
+#   tokenize      chat template + tokenization (shared by the whole batch)
+#   prefill       prompt prefill, up to the first generated token
+#   decode        token-by-token generation
+#   parse         splitting the output into text and <ASL> gloss
+#   serialize     building the JSON response
+# tokenize through parse run on the inference worker, once per batch.
+
+STAGES = ("receive", "decode_audio", "preprocess", "queue", "tokenize", "prefill", "decode", "parse", "serialize")
+INFERENCE_STAGES = ("tokenize", "prefill", "decode", "parse")
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class RequestTimer:
+    """Collects stage durations for one request with successive `lap` calls."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.timings = {}
+        self.inference = {}
+        self.audio_s = None
+        self.trimmed_audio_s = None
+        self._last = self.started
+
+    def lap(self, stage):
+        """Records the time since the previous lap under `stage`."""
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def set_audio_duration(self, original_s, trimmed_s):
+        """Records the upload's duration before and after silence trimming."""
+        self.audio_s = original_s
+        self.trimmed_audio_s = trimmed_s
+
+    def add_inference(self, stats):
+        """
+        Splits the time since the previous lap into queue wait plus the batch's
+        tokenize/prefill/decode/parse stages measured on the inference worker.
+        """
+        now = time.perf_counter()
+        inference_s = sum(stats.get(stage, 0.0) for stage in INFERENCE_STAGES)
+        self.timings["queue"] = max(0.0, (now - self._last) - inference_s)
+        for stage in INFERENCE_STAGES:
+            if stage in stats:
+                self.timings[stage] = stats[stage]
+        self.inference = stats
+        self._last = now
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def as_log(self, status):
+        """One JSON line describing the request."""
+        record = {"endpoint": self.endpoint, "status": status, "total_ms": round(self.total() * 1000, 2)}
+        for stage in STAGES:
+            if stage in self.timings:
+                record[f"{stage}_ms"] = round(self.timings[stage] * 1000, 2)
+        if self.audio_s is not None:
+            record["audio_s"] = round(self.audio_s, 3)
+            record["trimmed_audio_s"] = round(self.trimmed_audio_s, 3)
+        decode_s = self.inference.get("decode")
+        tokens = self.inference.get("generated_tokens")
+        if tokens is not None:
+            record["generated_tokens"] = tokens
+            record["batch_size"] = self.inference.get("batch_size", 1)
+        if "tag_saved_steps" in self.inference:
+            record["max_new_tokens"] = self.inference["max_new_tokens"]
+            if "stop_reason" in self.inference:
+                record["stop_reason"] = self.inference["stop_reason"]
+            record["tag_saved_steps"] = self.inference["tag_saved_steps"]
+            record["budget_cut_steps"] = self.inference.get("budget_cut_steps", 0)
+        if "chunks" in self.inference:
+            record["chunks"] = self.inference["chunks"]
+        if decode_s and tokens:
+            record["tokens_per_s"] = round(tokens / decode_s, 1)
+        return json.dumps(record)
+
+
+class ServerMetrics:
+    """Prometheus metrics for the transcription server."""
+
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        self.stage_seconds = Histogram(
+            "gemma_stage_seconds", "Time spent in each request stage",
+            ["stage"], buckets=_LATENCY_BUCKETS, registry=self.registry,
+        )
+        self.request_seconds = Histogram(
+            "gemma_request_seconds", "End-to-end request latency",
+            ["endpoint", "status"], buckets=_LATENCY_BUCKETS, registry=self.registry,
+        )
+        self.generated_tokens = Counter(
+            "gemma_generated_tokens", "Tokens generated by the model", registry=self.registry,
+        )
+        self.stopped_rows = Counter(
+            "gemma_stopped_rows", "Generated rows by the criterion that ended them (tag, eos or budget)",
+            ["reason"], registry=self.registry,
+        )
+        self.tag_saved_steps = Counter(
+            "gemma_tag_saved_decode_steps", "Budget left when the closing </ASL> tag ended a row (upper bound)",
+            registry=self.registry,
+        )
+        self.budget_cut_steps = Counter(
+            "gemma_budget_cut_decode_steps", "Steps between the audio-based budget and the fixed max_new_tokens "
+            "limit, for rows that ran out of the budget", registry=self.registry,
+        )
+        self.decode_tokens_per_second = Histogram(
+            "gemma_decode_tokens_per_second", "Decode throughput of each generate call",
+            buckets=(5, 10, 25, 50, 100, 250, 500, 1000, 2500), registry=self.registry,
+        )
+        self.batch_size = Histogram(
+            "gemma_batch_size", "Requests per generate call",
+            buckets=(1, 2, 4, 8, 16, 32, 64), registry=self.registry,
+        )
+        self.audio_seconds = Histogram(
+            "gemma_audio_seconds", "Uploaded audio duration before and after silence trimming",
+            ["kind"], buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120), registry=self.registry,
+        )
+        self.trimmed_seconds = Counter(
+            "gemma_trimmed_audio_seconds", "Seconds of silence trimmed before prefill", registry=self.registry,
+        )
+        self.queue_depth = Gauge(
+            "gemma_queue_depth", "Requests waiting for the inference worker", registry=self.registry,
+        )
+        self.gpu_memory_bytes = Gauge(
+            "gemma_gpu_memory_bytes", "CUDA caching allocator memory",
+            ["kind"], registry=self.registry,
+        )
+
+    def bind_queue_depth(self, depth_fn):
+        self.queue_depth.set_function(depth_fn)
+
+    def bind_gpu_memory(self, stats_fn):
+        """`stats_fn` returns a dict such as `memory_policy.allocator_stats`."""
+        for kind in ("allocated", "reserved", "max_reserved", "total"):
+            self.gpu_memory_bytes.labels(kind).set_function(lambda kind=kind: stats_fn().get(kind, 0))
+
+    def add_gauge_function(self, name, documentation, fn):
+        """Exposes the value returned by `fn` at scrape time."""
+        Gauge(name, documentation, registry=self.registry).set_function(fn)
+
+    def observe_generation(self, stats):
+        """Records one generate call (shared by every request in its batch)."""
+        self.batch_size.observe(stats.get("batch_size", 1))
+        tokens = stats.get("generated_tokens", 0)
+        self.generated_tokens.inc(tokens)
+        for row in stats.get("rows", ()):
+            self.stopped_rows.labels(row["stop_reason"]).inc()
+            self.tag_saved_steps.inc(row["tag_saved_steps"])
+            self.budget_cut_steps.inc(row.get("budget_cut_steps", 0))
+        if stats.get("decode"):
+            self.decode_tokens_per_second.observe(tokens / stats["decode"])
+
+    def observe_audio(self, original_s, trimmed_s):
+        self.audio_seconds.labels("original").observe(original_s)
+        self.audio_seconds.labels("trimmed").observe(trimmed_s)
+        self.trimmed_seconds.inc(original_s - trimmed_s)
+
+    def observe_request(self, timer, status):
+        for stage, seconds in timer.timings.items():
+            self.stage_seconds.labels(stage).observe(seconds)
+        self.request_seconds.labels(timer.endpoint, str(status)).observe(timer.total())
+
+    def render(self):
+        """Returns `(body, content_type)` in the Prometheus text format."""
+        return generate_latest(self.registry), CONTENT_TYPE_LATEST
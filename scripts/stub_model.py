@@ -0,0 +1,175 @@
+import time
+from types import SimpleNamespace
+
+# --- Stub Model & Processor ---
+# Stand-ins for the Gemma 3n model and processor that follow the same
+# `apply_chat_template` / `generate` / `batch_decode` calls as the real ones.
+# They let the serving code run on a CPU-only box: every decode step sleeps for
+# `per_token_delay_s` once per batch, like a GPU that decodes all rows at once.
+
+PAD_TOKEN_ID = 0
+EOS_TOKEN_ID = 1
+AUDIO_TOKEN_ID = 2
+_FIRST_CHAR_ID = 3
+
+# Gemma 3n's audio encoder emits roughly 6.25 tokens per second of 16 kHz audio.
+AUDIO_TOKENS_PER_SECOND = 6.25
+AUDIO_TOKENS_FOR_PATH = 32
+
+DEFAULT_REPLY = "Hello, how are you?<ASL>HELLO HOW YOU</ASL>"
+
+
+class StubTensor(list):
+    """
+    A (nested) list with the bits of the tensor API the serving code uses:
+    `.shape`, `.tolist()` and `[rows, cols]` slicing.
+    """
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            rows, cols = index
+            return StubTensor(StubTensor(row[cols]) for row in list.__getitem__(self, rows))
+        item = list.__getitem__(self, index)
+        return StubTensor(item) if isinstance(index, slice) else item
+
+    @property
+    def shape(self):
+        if self and isinstance(self[0], list):
+            return (len(self), len(self[0]))
+        return (len(self),)
+
+    def tolist(self):
+        return [row.tolist() if isinstance(row, StubTensor) else row for row in self]
+
+
+class StubCache:
+    """Past-key-values stand-in that only tracks how many tokens it covers."""
+
+    def __init__(self):
+        self.length = 0
+
+
+class StubBatch(dict):
+    """A dict of inputs with the `.to(device)` call the real BatchFeature has."""
+
+    def to(self, device):
+        return self
+
+
+class StubProcessor:
+    """Character-level tokenizer that understands the chat message format."""
+
+    def __init__(self):
+        self.padding_side = "left"
+        self.pad_token_id = PAD_TOKEN_ID
+        self.eos_token_id = EOS_TOKEN_ID
+        self.audio_token_id = AUDIO_TOKEN_ID
+
+    def encode(self, text):
+        return [_FIRST_CHAR_ID + ord(char) for char in text]
+
+    def _audio_tokens(self, audio):
+        if isinstance(audio, str):
+            return [AUDIO_TOKEN_ID] * AUDIO_TOKENS_FOR_PATH
+        seconds = len(audio) / 16000
+        return [AUDIO_TOKEN_ID] * max(1, int(seconds * AUDIO_TOKENS_PER_SECOND))
+
+    def _encode_conversation(self, messages, add_generation_prompt):
+        ids = []
+        for message in messages:
+            ids.extend(self.encode(f"<start_of_turn>{message['role']}\n"))
+            for part in message["content"]:
+                if part["type"] == "audio":
+                    ids.extend(self._audio_tokens(part["audio"]))
+                else:
+                    ids.extend(self.encode(part["text"]))
+            ids.extend(self.encode("<end_of_turn>\n"))
+        if add_generation_prompt:
+            ids.extend(self.encode("<start_of_turn>model\n"))
+        return ids
+
+    def apply_chat_template(self, conversations, add_generation_prompt=False,
+                            tokenize=False, return_dict=False, return_tensors=None,
+                            padding=False, **kwargs):
+        # A single conversation is a list of message dicts; a batch is a list of those.
+        is_batch = bool(conversations) and isinstance(conversations[0], list)
+        batch = conversations if is_batch else [conversations]
+        rows = [self._encode_conversation(messages, add_generation_prompt) for messages in batch]
+
+        width = max(len(row) for row in rows)
+        input_ids, attention_mask = [], []
+        for row in rows:
+            pad = [PAD_TOKEN_ID] * (width - len(row))
+            if self.padding_side == "left":
+                input_ids.append(StubTensor(pad + row))
+                attention_mask.append(StubTensor([0] * len(pad) + [1] * len(row)))
+            else:
+                input_ids.append(StubTensor(row + pad))
+                attention_mask.append(StubTensor([1] * len(row) + [0] * len(pad)))
+
+        return StubBatch(input_ids=StubTensor(input_ids), attention_mask=StubTensor(attention_mask))
+
+    def decode(self, token_ids, skip_special_tokens=True):
+        return "".join(
+            chr(token_id - _FIRST_CHAR_ID) for token_id in token_ids
+            if token_id >= _FIRST_CHAR_ID or not skip_special_tokens
+        )
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        return [self.decode(row, skip_special_tokens) for row in sequences]
+
+
+class StubModel:
+    """
+    Emits `reply` one character per decode step. The prefill costs
+    `prefill_delay_s` per prompt token of the longest row that is not already
+    covered by `past_key_values`, and each decode step costs
+    `per_token_delay_s`, independent of how many rows are in the batch.
+    """
+
+    def __init__(self, reply=DEFAULT_REPLY, per_token_delay_s=0.005, prefill_delay_s=0.0):
+        self.reply = reply
+        self.per_token_delay_s = per_token_delay_s
+        self.prefill_delay_s = prefill_delay_s
+        self._reply_ids = StubProcessor().encode(reply)
+
+    def __call__(self, input_ids, past_key_values=None, **kwargs):
+        """Forward pass over `input_ids`, extending `past_key_values`."""
+        cache = past_key_values if past_key_values is not None else StubCache()
+        width = len(input_ids[0])
+        time.sleep(self.prefill_delay_s * width)
+        cache.length += width
+        return SimpleNamespace(past_key_values=cache)
+
+    def generate(self, input_ids, attention_mask=None, max_new_tokens=256, streamer=None,
+                 past_key_values=None, stopping_criteria=None, **kwargs):
+        width = len(input_ids[0])
+        cached = past_key_values.length if past_key_values is not None else 0
+        time.sleep(self.prefill_delay_s * (width - cached))
+        if streamer is not None:
+            streamer.put(StubTensor([StubTensor(input_ids[0])]))
+
+        # Rows that have finished are padded until the whole batch is done
+        rows = [list(row) for row in input_ids]
+        unfinished = [True] * len(rows)
+        completion = (self._reply_ids + [EOS_TOKEN_ID])[:max_new_tokens]
+        for token_id in completion:
+            time.sleep(self.per_token_delay_s)
+            for row, active in zip(rows, unfinished):
+                row.append(token_id if active else PAD_TOKEN_ID)
+            if streamer is not None:
+                streamer.put(StubTensor([token_id]))
+            for criterion in stopping_criteria or ():
+                done = criterion(StubTensor(StubTensor(row) for row in rows), None)
+                unfinished = [active and not stop for active, stop in zip(unfinished, done)]
+            if not any(unfinished):
+                break
+        if streamer is not None:
+            streamer.end()
+
+        return rows
+
+
+def load_stub_model(**kwargs):
+    """Returns a `(model, tokenizer)` pair shaped like `FastModel.from_pretrained`."""
+    return StubModel(**kwargs), StubProcessor()
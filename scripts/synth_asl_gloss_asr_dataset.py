@@ -1,18 +1,89 @@
 import pandas as pd
-from datasets import load_dataset
+from datasets import Audio, Dataset, concatenate_datasets, load_dataset
 from tqdm import tqdm
+import argparse
+import os
+import resource
+import subprocess
+import sys
 import time
+import zlib
+from collections import Counter
 from datetime import timedelta
-from vllm import LLM, SamplingParams
+from gloss_cache import GlossCache, make_namespace, normalize_text
+from gloss_shards import ShardStore, collect_shards, covering_paths, manifest_name
+from gloss_validation import validate_glosses
 
 # --- vLLM Configuration ---
 VLLM_MODEL = "google/gemma-3n-E4B-it"
+# Increased max_tokens slightly as a safeguard for longer translations
+SAMPLING_PARAMS = {"temperature": 0.2, "top_p": 0.95, "max_tokens": 200}
+
+# --- Validation Configuration ---
+# Each generated shard is checked with gloss_validation.py. Only the records
+# that fail are regenerated, with SAMPLING_PARAMS updated by each of these in
+# turn until they pass, and the shard is rewritten with the fixes.
+RETRY_SAMPLING_PARAMS = [
+    {"temperature": 0.0, "repetition_penalty": 1.1},
+    {"temperature": 0.7, "top_p": 0.9, "repetition_penalty": 1.1},
+]
+
+# --- Dataset Configuration ---
+DATASET_PATH = "openslr/librispeech_asr"
+DATASET_CONFIG = "clean"
+DATASET_SPLIT = "train.100"
 
 # --- Batching Configuration ---
+# "window" hands GENERATION_WINDOW prompts (0 = the whole shard, see
+# SHARD_SIZE) to one llm.generate call, so vLLM's continuous batching keeps the GPU full and the
+# shared few-shot prefix of PROMPT_TEMPLATE is prefilled once and reused from
+# the prefix cache. "batched" is the old loop of BATCH_SIZE prompts per call.
+GENERATION_MODE = "window"
+GENERATION_WINDOW = 0
 BATCH_SIZE = 8
+ENABLE_PREFIX_CACHING = True
+# Records to time both modes on before the run (0 = skip the comparison)
+COMPARE_MODES_RECORDS = 0
+
+# --- Data Loading Configuration ---
+# Generation reads only the `text` column of the memory-mapped dataset; the
+# audio column is switched to undecoded bytes, so neither slicing nor
+# add_column/save_to_disk ever decodes a waveform. Set this to time the old
+# row slicing (which decodes every row's audio) against the projection.
+COMPARE_TEXT_READ_RECORDS = 0
 
 # --- Output Configuration ---
 OUTPUT_DATASET_DIR = "english_dialects_asl_gloss_vllm_batched"
+# Glosses are checkpointed to Parquet shards of SHARD_SIZE records (see
+# gloss_shards.py); a rerun resumes after the last finished shard, and the
+# shards are joined onto the dataset at the end. Larger shards batch better,
+# smaller ones lose less work to a crash.
+SHARD_DIR = OUTPUT_DATASET_DIR + "_shards"
+SHARD_SIZE = 4096
+
+# --- Data-Parallel Configuration ---
+# With --num-workers N the records are split into N contiguous index ranges;
+# each worker process loads its own engine, generates its range into its own
+# shards and manifest (see gloss_shards.py), and the coordinator follows their
+# progress and merges the shards in index order. Workers can run on several
+# nodes that share SHARD_DIR:
+#
+#   node A: python synth_asl_gloss_asr_dataset.py --num-workers 4 --local-workers 0,1 --gpus 0,1 --no-merge
+#   node B: python synth_asl_gloss_asr_dataset.py --num-workers 4 --local-workers 2,3 --gpus 0,1 --no-merge
+#   then:   python synth_asl_gloss_asr_dataset.py --num-workers 4 --merge-only
+#
+# `--engine stub` swaps the LLM for a deterministic generator to test the
+# sharding, resuming and merging without a GPU.
+PROGRESS_INTERVAL_S = 5
+
+# --- Translation Cache Configuration ---
+# Glosses are cached per normalized sentence across runs and datasets (see
+# gloss_cache.py); repeated sentences are generated once. The namespace covers
+# the retry sampling settings too (see generation_namespace). Empty disables the
+# cache (duplicates within a shard are still generated only once). Workers on
+# different nodes should each use a local file: SQLite locking is not reliable
+# on network filesystems.
+GLOSS_CACHE_PATH = "asl_gloss_cache.sqlite"
 
 # --- [CRITICAL CHANGE 1] - Prompt Template using Gemma's Chat Format ---
 # We wrap the prompt in the model's required chat structure. This significantly
@@ -68,72 +139,451 @@ def parse_model_output(raw_output: str) -> str:
     
     return cleaned_gloss if cleaned_gloss else "ERROR: PARSING FAILED"
 
-def main():
+def peak_rss_mb():
+    """Peak resident memory of this process so far (ru_maxrss is in KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def read_texts(dataset, start=0, stop=None):
+    """The transcripts of rows [start, stop), from the `text` column alone."""
+    return dataset.select_columns(["text"])[start:stop]["text"]
+
+
+def compare_text_reads(dataset, num_records, batch_size=BATCH_SIZE):
+    """Times reading `num_records` transcripts by projection and by the old row slicing."""
+    sample = dataset.select(range(min(num_records, len(dataset))))
+    start_time = time.time()
+    read_texts(sample)
+    print(f"  text column: {time.time() - start_time:.2f}s, peak RSS {peak_rss_mb():.0f} MiB")
+    # Peak RSS only grows, so the decoding variant runs second
+    start_time = time.time()
+    for i in range(0, len(sample), batch_size):
+        sample[i : i + batch_size]['text']
+    print(f"  row slices:  {time.time() - start_time:.2f}s, peak RSS {peak_rss_mb():.0f} MiB")
+
+
+def generate_batched(llm, texts, sampling_params, batch_size=BATCH_SIZE):
+    """The original loop: one llm.generate call per `batch_size` texts."""
+    glosses = []
+    for i in tqdm(range(0, len(texts), batch_size), desc="Processing in batches"):
+        batch_prompts = [PROMPT_TEMPLATE.format(english_text=text) for text in texts[i : i + batch_size]]
+        batch_outputs = llm.generate(batch_prompts, sampling_params, use_tqdm=False)
+        glosses.extend(parse_model_output(output.outputs[0].text) for output in batch_outputs)
+    return glosses
+
+
+def generate_windowed(llm, texts, sampling_params, window=GENERATION_WINDOW):
     """
-    Main function to load data, process it in batches with vLLM, and save the dataset.
+    Submits `window` texts (all of them if 0) per llm.generate call and lets
+    vLLM schedule them. Outputs come back in prompt order; each is checked
+    against its prompt so a gloss can never land on the wrong sentence.
     """
-    print(f"Loading model '{VLLM_MODEL}' with vLLM...")
-    try:
-        llm = LLM(model=VLLM_MODEL)
-    except Exception as e:
-        print(f"Error loading LLM: {e}")
-        return
+    window = window or max(len(texts), 1)
+    glosses = []
+    for i in range(0, len(texts), window):
+        prompts = [PROMPT_TEMPLATE.format(english_text=text) for text in texts[i : i + window]]
+        outputs = llm.generate(prompts, sampling_params, use_tqdm=True)
+        if len(outputs) != len(prompts):
+            raise RuntimeError(f"vLLM returned {len(outputs)} outputs for {len(prompts)} prompts")
+        for prompt, output in zip(prompts, outputs):
+            if output.prompt != prompt:
+                raise RuntimeError("vLLM returned outputs out of prompt order")
+            glosses.append(parse_model_output(output.outputs[0].text))
+    return glosses
+
+
+def generate_glosses(llm, texts, sampling_params, mode=GENERATION_MODE):
+    if mode == "window":
+        return generate_windowed(llm, texts, sampling_params)
+    if mode == "batched":
+        return generate_batched(llm, texts, sampling_params)
+    raise ValueError(f"Unknown GENERATION_MODE {mode!r}")
+
+
+class VllmEngine:
+    """The real generator: VLLM_MODEL with SAMPLING_PARAMS."""
+
+    name = "vllm"
+    model = VLLM_MODEL
+
+    def __init__(self, mode=GENERATION_MODE):
+        from vllm import LLM, SamplingParams
+        self.llm = LLM(model=VLLM_MODEL, enable_prefix_caching=ENABLE_PREFIX_CACHING)
+        self.sampling_params = SamplingParams(**SAMPLING_PARAMS)
+        self.mode = mode
+
+    def generate(self, texts, sampling_overrides=None):
+        sampling_params = self.sampling_params
+        if sampling_overrides:
+            from vllm import SamplingParams
+            sampling_params = SamplingParams(**{**SAMPLING_PARAMS, **sampling_overrides})
+        return generate_glosses(self.llm, texts, sampling_params, self.mode)
+
+
+# Words the stub's rough English-to-gloss rewrite leaves out
+_STUB_DROPPED_WORDS = frozenset("THE A AN IS ARE WAS WERE BE BEEN AM DO DOES DID TO OF".split())
+
+
+class StubEngine:
+    """
+    Deterministic stand-in: the sentence's words uppercased without articles,
+    "to", "of" and forms of "be"/"do", after `per_record_delay_s`. With
+    `failure_every`, about one sentence in that many comes back the way LLMs
+    get it wrong (prose preamble, the English sentence echoed, a trailing note,
+    runaway repetition) unless sampling overrides are given, to exercise the
+    retries; a quarter of those are echoes that no retry fixes.
+    """
+
+    name = "stub"
+    model = "stub"
+
+    def __init__(self, per_record_delay_s=0.0, failure_every=0):
+        self.per_record_delay_s = per_record_delay_s
+        self.failure_every = failure_every
+
+    def _gloss(self, text, sampling_overrides):
+        words = normalize_text(text).upper().split()
+        gloss = " ".join(word for word in words if word not in _STUB_DROPPED_WORDS) or "ERROR: PARSING FAILED"
+        checksum = zlib.crc32(text.encode())
+        if not self.failure_every or checksum % self.failure_every:
+            return gloss
+        kind = checksum // self.failure_every % 4
+        if kind == 0:
+            return " ".join(words)  # echoed on every try
+        if sampling_overrides:
+            return gloss
+        if kind == 1:
+            return f"Here is the ASL gloss for: {text.lower()}"
+        if kind == 2:
+            return f"{gloss}\nNote: the gloss follows ASL topic-comment order."
+        return " ".join([gloss] * 4)
+
+    def generate(self, texts, sampling_overrides=None):
+        time.sleep(self.per_record_delay_s * len(texts))
+        return [self._gloss(text, sampling_overrides) for text in texts]
+
+
+ENGINES = {engine.name: engine for engine in (VllmEngine, StubEngine)}
+
+
+def generate_deduplicated(engine, texts, cache=None):
+    """
+    Glosses `texts`, generating each normalized sentence once and only if
+    `cache` does not have it. Returns `(glosses, generated_count)`.
+    """
+    keys = [normalize_text(text) for text in texts]
+    first_texts = {}
+    for key, text in zip(keys, texts):
+        first_texts.setdefault(key, text)
+
+    glosses = cache.get_many(first_texts) if cache is not None else {}
+    misses = [key for key in first_texts if key not in glosses]
+    generated = engine.generate([first_texts[key] for key in misses])
+    if len(generated) != len(misses):
+        raise RuntimeError(f"Engine returned {len(generated)} glosses for {len(misses)} sentences")
+    glosses.update(zip(misses, generated))
+    if cache is not None:
+        # Invalid glosses are left out so they are regenerated rather than reused
+        reasons = validate_glosses([first_texts[key] for key in misses], generated)
+        cache.put_many((key, gloss) for key, gloss, reason in zip(misses, generated, reasons) if reason is None)
+    return [glosses[key] for key in keys], len(misses)
+
+
+def validate_and_retry(store, dataset, get_engine, cache=None):
+    """
+    Validates the shards of `store` not validated yet and regenerates their
+    failing records with RETRY_SAMPLING_PARAMS; each shard is rewritten with
+    the fixed glosses, the reason of every record still invalid in
+    `asl_gloss_error`, and marked validated. `get_engine()` is only called if
+    something failed. Returns `(failures by reason, fixed, still failing)`.
+    """
+    failures, fixed, unfixed = Counter(), 0, 0
+    for shard in [shard for shard in store.shards if not shard.get("validated")]:
+        start, stop = shard["start"], shard["stop"]
+        texts = read_texts(dataset, start, stop)
+        glosses = store.read_glosses(shard)
+        reasons = validate_glosses(texts, glosses)
+        failing = [i for i, reason in enumerate(reasons) if reason is not None]
+        failures.update(reasons[i] for i in failing)
+        failed_count = len(failing)
+
+        for overrides in RETRY_SAMPLING_PARAMS:
+            if not failing:
+                break
+            retry_texts = [texts[i] for i in failing]
+            retried = get_engine().generate(retry_texts, overrides)
+            still_failing, passed = [], []
+            for i, gloss, reason in zip(failing, retried, validate_glosses(retry_texts, retried)):
+                reasons[i] = reason
+                if reason is None:
+                    glosses[i] = gloss
+                    passed.append(i)
+                else:
+                    still_failing.append(i)
+            if cache is not None:
+                cache.put_many((normalize_text(texts[i]), glosses[i]) for i in passed)
+            failing = still_failing
+
+        fixed += failed_count - len(failing)
+        unfixed += len(failing)
+        store.write_shard(start, stop, glosses, reasons, validated=True, invalid=len(failing))
+    return failures, fixed, unfixed
+
+
+def compare_modes(llm, texts, sampling_params):
+    """Times both modes on the same texts and prints records/sec for each."""
+    for mode in ("batched", "window"):
+        start_time = time.time()
+        generate_glosses(llm, texts, sampling_params, mode)
+        duration = time.time() - start_time
+        print(f"{mode:>8}: {len(texts)} records in {duration:.1f}s, {len(texts) / duration:.2f} records/sec")
 
-    print("Loading 'ai4bharat/Svarah' dataset from Hugging Face...")
-    try:
-        # Use a configuration that has audio data, 'hi' for Hindi for example
-        dataset = load_dataset("openslr/librispeech_asr", "clean", split="train.100")
-    except Exception as e:
-        print(f"Failed to load dataset. Error: {e}")
-        return
-    
-    # FOR TESTING
-    # dataset = dataset.select(range(200))
 
+def load_source_dataset(args):
+    """The dataset to gloss, with its audio (if any) left undecoded, and the original audio feature."""
+    print(f"Loading '{args.dataset}' dataset from Hugging Face...")
+    # Use a configuration that has audio data, 'hi' for Hindi for example
+    dataset = load_dataset(args.dataset, args.dataset_config or None, split=args.split)
+    if args.limit:
+        dataset = dataset.select(range(min(args.limit, len(dataset))))
+    print(f"Dataset loaded successfully with {len(dataset)} records.")
+
+    if COMPARE_TEXT_READ_RECORDS:
+        print(f"\nComparing transcript reads on {COMPARE_TEXT_READ_RECORDS} records...")
+        compare_text_reads(dataset, COMPARE_TEXT_READ_RECORDS)
+
+    # Keep the feature to restore on save; until then the audio stays as raw bytes
+    audio_feature = dataset.features.get("audio")
+    if audio_feature is not None:
+        dataset = dataset.cast_column("audio", Audio(decode=False))
+    return dataset, audio_feature
+
+
+def generation_namespace(engine_class):
+    """
+    Hash of the model, PROMPT_TEMPLATE, SAMPLING_PARAMS and RETRY_SAMPLING_PARAMS:
+    the gloss cache namespace, since retried glosses are cached too.
+    """
+    generation = {"sampling": SAMPLING_PARAMS, "retries": RETRY_SAMPLING_PARAMS}
+    return make_namespace(engine_class.model, PROMPT_TEMPLATE, generation)
+
+
+def run_config(args, engine_class):
+    """
+    What the shards depend on; a resume with anything else is refused. The
+    prompt and sampling settings are recorded as a hash, and SHARD_SIZE because
+    pending ranges are counted in whole shards.
+    """
+    return {"model": engine_class.model, "dataset": [args.dataset, args.dataset_config, args.split],
+            "limit": args.limit, "num_workers": args.num_workers, "shard_size": SHARD_SIZE,
+            "generation": generation_namespace(engine_class)}
+
+
+def worker_range(total_records, worker_id, num_workers):
+    return total_records * worker_id // num_workers, total_records * (worker_id + 1) // num_workers
+
+
+def run_worker(args, dataset, worker_id):
+    """
+    Generates the shards of one worker's index range that are not done yet,
+    then validates them and regenerates the failing records.
+    """
+    engine_class = ENGINES[args.engine]
     total_records = len(dataset)
-    print(f"Dataset loaded successfully with {total_records} records.")
+    first, last = worker_range(total_records, worker_id, args.num_workers)
+    store = ShardStore(args.shard_dir, total_records, run_config(args, engine_class),
+                       manifest_name(worker_id, args.num_workers))
+    pending = store.pending_ranges(first, last, SHARD_SIZE or max(last - first, 1))
+    if store.done_records():
+        print(f"Resuming: {store.done_records()} records already in '{args.shard_dir}'")
 
-    print(f"\nStarting ASL Gloss generation for {total_records} records in batches of {BATCH_SIZE}...")
-    
-    # Increased max_tokens slightly as a safeguard for longer translations
-    sampling_params = SamplingParams(temperature=0.2, top_p=0.95, max_tokens=200)
-    all_generated_glosses = []
-    
+    engine = None
+
+    def get_engine():
+        nonlocal engine
+        if engine is None:
+            print(f"Loading the '{args.engine}' engine...")
+            if engine_class is StubEngine:
+                engine = StubEngine(args.stub_delay_ms / 1000, args.stub_failure_every)
+            else:
+                engine = VllmEngine()
+        return engine
+
+    cache = None
+    if args.cache:
+        cache = GlossCache(args.cache, generation_namespace(engine_class))
+    if pending:
+        generate_pending(args, dataset, worker_id, store, pending, get_engine(), cache)
+
+    if not args.skip_validation:
+        print("Validating the generated glosses...")
+        start_time = time.time()
+        failures, fixed, unfixed = validate_and_retry(store, dataset, get_engine, cache)
+        print(f"Validation: {sum(failures.values())} invalid glosses "
+              f"({', '.join(f'{reason} {count}' for reason, count in failures.most_common()) or 'none'}), "
+              f"{fixed} fixed by regeneration, {unfixed} still invalid, {time.time() - start_time:.1f}s")
+        if unfixed:
+            print(f"Warning: {unfixed} glosses are still invalid; they are kept with their reason in 'asl_gloss_error'")
+
+
+def generate_pending(args, dataset, worker_id, store, pending, engine, cache):
+    """Generates and checkpoints the `pending` shard ranges of one worker."""
+    first, last = pending[0][0], pending[-1][1]
+    records_to_generate = sum(stop - start for start, stop in pending)
+    if COMPARE_MODES_RECORDS and isinstance(engine, VllmEngine):
+        print(f"\nComparing generation modes on {COMPARE_MODES_RECORDS} records...")
+        compare_modes(engine.llm, read_texts(dataset, first, first + COMPARE_MODES_RECORDS), engine.sampling_params)
+
+    print(f"\nStarting ASL Gloss generation for records {first}-{last} "
+          f"({records_to_generate} to do, {args.engine} engine, {GENERATION_MODE} mode)...")
     start_time = time.time()
-    
-    for i in tqdm(range(0, total_records, BATCH_SIZE), desc="Processing in batches"):
-        batch_texts = dataset[i : i + BATCH_SIZE]['text']
-        batch_prompts = [PROMPT_TEMPLATE.format(english_text=text) for text in batch_texts]
-        batch_outputs = llm.generate(batch_prompts, sampling_params)
-        
-        # Use the robust parsing function here
-        batch_glosses = [parse_model_output(output.outputs[0].text) for output in batch_outputs]
-        all_generated_glosses.extend(batch_glosses)
-        
+    generated_records = 0
+    for start, stop in tqdm(pending, desc=f"Worker {worker_id} shards"):
+        glosses, generated = generate_deduplicated(engine, read_texts(dataset, start, stop), cache)
+        store.write_shard(start, stop, glosses)
+        generated_records += generated
     end_time = time.time()
-    
+
     total_duration = end_time - start_time
-    avg_time_per_record = total_duration / total_records if total_records > 0 else 0
+    avg_time_per_record = total_duration / records_to_generate if records_to_generate > 0 else 0
 
     print("\n--- Generation Summary ---")
-    print(f"Total records processed: {total_records}")
+    print(f"Total records processed: {records_to_generate} (worker {worker_id})")
+    print(f"Sentences sent to the LLM: {generated_records} (the rest were duplicates or cached)")
+    if cache is not None:
+        print(f"Cache hit rate: {cache.hit_rate():.1%} of {cache.hits + cache.misses} lookups")
     print(f"Total time taken: {timedelta(seconds=total_duration)}")
     print(f"Average time per record: {avg_time_per_record:.4f} seconds")
+    print(f"Throughput: {records_to_generate / total_duration if total_duration > 0 else 0:.2f} records/sec")
+    print(f"Peak RSS: {peak_rss_mb():.0f} MiB")
     print("--------------------------\n")
 
-    print("Adding the 'asl_gloss' column to the dataset...")
-    if len(all_generated_glosses) != total_records:
-        print(f"Error: Mismatch in record count. Expected {total_records}, but got {len(all_generated_glosses)} glosses.")
+
+def worker_command(args, worker_id):
+    command = [sys.executable, os.path.abspath(__file__), "--worker-id", str(worker_id),
+               "--num-workers", str(args.num_workers), "--engine", args.engine, "--dataset", args.dataset,
+               "--dataset-config", args.dataset_config, "--split", args.split, "--limit", str(args.limit),
+               "--shard-dir", args.shard_dir, "--cache", args.cache, "--stub-delay-ms", str(args.stub_delay_ms),
+               "--stub-failure-every", str(args.stub_failure_every)]
+    if args.skip_validation:
+        command.append("--skip-validation")
+    return command
+
+
+def run_local_workers(args, worker_ids, total_records, config):
+    """
+    Starts one process per worker id (logging to shard_dir/worker-NNN.log,
+    with CUDA_VISIBLE_DEVICES from --gpus in turn) and shows their combined
+    progress until they exit. Returns True if all of them succeeded.
+    """
+    gpus = args.gpus.split(",") if args.gpus else []
+    os.makedirs(args.shard_dir, exist_ok=True)
+    processes = {}
+    for slot, worker_id in enumerate(worker_ids):
+        env = dict(os.environ)
+        if gpus:
+            env["CUDA_VISIBLE_DEVICES"] = gpus[slot % len(gpus)]
+        log = open(os.path.join(args.shard_dir, f"worker-{worker_id:03d}.log"), "a")
+        processes[worker_id] = (subprocess.Popen(worker_command(args, worker_id), env=env, stdout=log,
+                                                 stderr=subprocess.STDOUT), log)
+
+    with tqdm(total=total_records, desc="Records") as progress:
+        while True:
+            running = any(process.poll() is None for process, _ in processes.values())
+            done = sum(shard["stop"] - shard["start"] for shard in collect_shards(args.shard_dir, total_records, config))
+            progress.update(done - progress.n)
+            if not running:
+                break
+            time.sleep(PROGRESS_INTERVAL_S)
+
+    succeeded = True
+    for worker_id, (process, log) in processes.items():
+        log.close()
+        if process.returncode != 0:
+            print(f"Worker {worker_id} failed with exit code {process.returncode}, see {log.name}")
+            succeeded = False
+    return succeeded
+
+
+def merge_shards(args, dataset, audio_feature, config):
+    """Joins every worker's shards onto the dataset in index order and saves it."""
+    total_records = len(dataset)
+    print("Adding the 'asl_gloss' and 'asl_gloss_error' columns to the dataset...")
+    try:
+        shard_paths = covering_paths(args.shard_dir, collect_shards(args.shard_dir, total_records, config),
+                                     total_records)
+    except ValueError as e:
+        print(f"Error: {e} (rerun to finish the missing ranges, then --merge-only)")
+        return
+    glosses = Dataset.from_parquet(shard_paths)
+    if glosses["index"] != list(range(total_records)):
+        print("Error: The gloss shards are not in record order.")
         return
 
-    updated_dataset = dataset.add_column("asl_gloss", all_generated_glosses)
-    
-    print(f"Saving the new dataset to the directory: '{OUTPUT_DATASET_DIR}'")
+    invalid = sum(error is not None for error in glosses["asl_gloss_error"])
+    if invalid:
+        print(f"Warning: {invalid} of {total_records} glosses failed validation; "
+              f"filter out the rows where 'asl_gloss_error' is set")
+
+    # Joined by row index; the audio bytes are carried over as they are
+    updated_dataset = concatenate_datasets([dataset, glosses.select_columns(["asl_gloss", "asl_gloss_error"])], axis=1)
+    if audio_feature is not None:
+        updated_dataset = updated_dataset.cast_column("audio", audio_feature)
+
+    print(f"Saving the new dataset to the directory: '{args.output}'")
     try:
-        updated_dataset.save_to_disk(OUTPUT_DATASET_DIR)
-        print("\nDataset saved successfully!")
+        updated_dataset.save_to_disk(args.output)
+        print(f"\nDataset saved successfully! (peak RSS {peak_rss_mb():.0f} MiB)")
     except Exception as e:
         print(f"Failed to save the dataset. Error: {e}")
 
+
+def main():
+    """
+    Main function to load data, generate the glosses, and save the dataset.
+    """
+    parser = argparse.ArgumentParser(description="Generate ASL gloss for an ASR dataset with vLLM")
+    parser.add_argument("--engine", default="vllm", choices=list(ENGINES))
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--dataset-config", default=DATASET_CONFIG)
+    parser.add_argument("--split", default=DATASET_SPLIT)
+    parser.add_argument("--limit", type=int, default=0, help="Only the first N records (0 = all), for testing")
+    parser.add_argument("--output", default=OUTPUT_DATASET_DIR)
+    parser.add_argument("--shard-dir", default=SHARD_DIR)
+    parser.add_argument("--cache", default=GLOSS_CACHE_PATH, help="Gloss cache file ('' disables it)")
+    parser.add_argument("--num-workers", type=int, default=1, help="Total workers across all nodes")
+    parser.add_argument("--worker-id", type=int, help="Run only this worker, in this process")
+    parser.add_argument("--local-workers", help="Comma separated worker ids to start here (default: all)")
+    parser.add_argument("--gpus", help="Comma separated CUDA devices to hand to the local workers in turn")
+    parser.add_argument("--no-merge", action="store_true", help="Leave merging to a later --merge-only run")
+    parser.add_argument("--merge-only", action="store_true")
+    parser.add_argument("--skip-validation", action="store_true", help="Do not validate and regenerate bad glosses")
+    parser.add_argument("--stub-delay-ms", type=float, default=0.0, help="Stub engine time per record")
+    parser.add_argument("--stub-failure-every", type=int, default=0,
+                        help="Stub engine: about one sentence in N comes back invalid on the first try")
+    args = parser.parse_args()
+
+    try:
+        dataset, audio_feature = load_source_dataset(args)
+    except Exception as e:
+        print(f"Failed to load dataset. Error: {e}")
+        sys.exit(1)
+    config = run_config(args, ENGINES[args.engine])
+
+    if args.worker_id is not None:
+        run_worker(args, dataset, args.worker_id)
+        return
+
+    if not args.merge_only:
+        if args.num_workers == 1 and not args.local_workers:
+            run_worker(args, dataset, 0)
+        else:
+            worker_ids = [int(worker_id) for worker_id in args.local_workers.split(",")] \
+                if args.local_workers else list(range(args.num_workers))
+            if not run_local_workers(args, worker_ids, len(dataset), config):
+                sys.exit(1)
+    if not args.no_merge:
+        merge_shards(args, dataset, audio_feature, config)
+
 if __name__ == "__main__":
     main()
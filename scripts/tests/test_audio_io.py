@@ -0,0 +1,81 @@
+import io
+import struct
+import numpy as np
+import pytest
+import soundfile as sf
+from audio_io import TARGET_SAMPLE_RATE, AudioDecodeError, _parse_pcm16_wav, decode_audio, resample
+
+
+def wav_bytes(samples, sample_rate=TARGET_SAMPLE_RATE, channels=1, data_size=None, extra_chunks=b""):
+    """A 16-bit PCM WAV; `data_size` overrides the size written in the data chunk header."""
+    pcm = np.asarray(samples, dtype="<i2").tobytes()
+    fmt = struct.pack("<HHIIHH", 0x0001, channels, sample_rate, sample_rate * 2 * channels, 2 * channels, 16)
+    body = (b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + extra_chunks
+            + b"data" + struct.pack("<I", len(pcm) if data_size is None else data_size) + pcm)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def test_mono_pcm16_is_read_without_libsndfile():
+    samples = np.arange(-800, 800, dtype=np.int16) * 16
+    data = wav_bytes(samples)
+    parsed, sample_rate, channels = _parse_pcm16_wav(data)
+    assert (sample_rate, channels) == (TARGET_SAMPLE_RATE, 1)
+    np.testing.assert_array_equal(parsed, samples)
+
+    audio = decode_audio(data)
+    assert audio.dtype == np.float32
+    np.testing.assert_allclose(audio, samples / 32768.0)
+
+
+def test_matches_libsndfile():
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-32768, 32767, size=(4000, 2), dtype=np.int16)
+    data = wav_bytes(samples.reshape(-1), sample_rate=8000, channels=2)
+    expected, _ = sf.read(io.BytesIO(data), dtype="float32")
+    np.testing.assert_allclose(decode_audio(data), resample(expected.mean(axis=1, dtype=np.float32), 8000),
+                               atol=1e-6)
+
+
+def test_stereo_is_downmixed():
+    data = wav_bytes([16384, 0] * 100, channels=2)
+    np.testing.assert_allclose(decode_audio(data), 0.25)
+
+
+def test_unknown_chunks_are_skipped():
+    odd_chunk = b"LIST" + struct.pack("<I", 3) + b"abc\0"  # Odd sizes are padded to a word
+    assert len(decode_audio(wav_bytes([1000] * 64, extra_chunks=odd_chunk))) == 64
+
+
+@pytest.mark.parametrize("data_size", [0, 0xFFFFFFFF])
+def test_streamed_data_size_reads_to_the_end(data_size):
+    assert len(decode_audio(wav_bytes([1000] * 64, data_size=data_size))) == 64
+
+
+def test_other_sample_rates_are_resampled():
+    assert len(decode_audio(wav_bytes([0] * 8000, sample_rate=8000))) == 16000
+
+
+def test_other_formats_fall_back_to_libsndfile():
+    buffer = io.BytesIO()
+    sf.write(buffer, np.full(1600, 0.5, dtype=np.float32), TARGET_SAMPLE_RATE, format="WAV", subtype="FLOAT")
+    data = buffer.getvalue()
+    assert _parse_pcm16_wav(data) is None
+    np.testing.assert_allclose(decode_audio(data), 0.5)
+
+
+@pytest.mark.parametrize("cut", [20, 24, 28, 30, 34])
+def test_truncated_fmt_chunk_is_rejected(cut):
+    with pytest.raises(AudioDecodeError):
+        decode_audio(wav_bytes(np.arange(1600, dtype=np.int16))[:cut])
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    wav_bytes([0] * 16, sample_rate=0),
+    wav_bytes([]),
+    b"RIFF\0\0\0\0WAVEnot a wav file",
+    b"\x00" * 64,
+], ids=["empty upload", "zero sample rate", "empty data chunk", "no chunks", "garbage"])
+def test_undecodable_uploads_are_rejected(data):
+    with pytest.raises(AudioDecodeError):
+        decode_audio(data)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from frame_codec import (HAND_LANDMARKS, KIND_HAND, KIND_POSE, QUANT_FLOAT16, QUANT_INT16, FrameArrays, decode,
+                         encode, landmark_layout, max_quantization_error)
+
+ENCODINGS = [(quantization, delta, deflate) for quantization in (QUANT_INT16, QUANT_FLOAT16)
+             for delta in (False, True) for deflate in (False, True)]
+
+
+def make_frames(kind, frame_count=60, seed=0):
+    rng = np.random.default_rng(seed)
+    layout = landmark_layout(kind)
+    base = rng.uniform(0.2, 0.8, size=(len(layout), 3)) * (1, 1, 0.1)
+    walk = np.cumsum(rng.normal(0, 0.004, size=(frame_count, len(layout), 3)), axis=0)
+    coords = (base + walk).astype(np.float32)
+    coords[rng.random((frame_count, len(layout))) < 0.1] = np.nan
+    if kind == KIND_HAND:
+        coords[rng.random(frame_count) < 0.3, len(HAND_LANDMARKS):] = np.nan  # Left hand missing
+    return FrameArrays(kind, np.arange(frame_count, dtype=np.int32) * 2, coords)
+
+
+@pytest.mark.parametrize("kind", [KIND_POSE, KIND_HAND])
+@pytest.mark.parametrize("quantization, delta, deflate", ENCODINGS)
+def test_round_trip_stays_within_the_error_bound(kind, quantization, delta, deflate):
+    frames = make_frames(kind)
+    blob = encode(frames, quantization, delta, deflate)
+    decoded = decode(blob)
+
+    assert decoded.kind == kind
+    np.testing.assert_array_equal(decoded.frame_index, frames.frame_index)
+    np.testing.assert_array_equal(np.isnan(decoded.coords), np.isnan(frames.coords))
+    error = np.nanmax(np.abs(decoded.coords - frames.coords))
+    assert error <= max_quantization_error(blob)
+
+
+def test_int16_bound_is_tight():
+    blob = encode(make_frames(KIND_POSE))
+    assert max_quantization_error(blob) < 1e-4
+
+
+def test_delta_encoding_is_lossless_on_the_quantized_values():
+    frames = make_frames(KIND_HAND)
+    np.testing.assert_array_equal(decode(encode(frames, delta=True)).coords, decode(encode(frames, delta=False)).coords)
+
+
+def test_constant_axis_and_empty_documents_round_trip():
+    coords = np.zeros((3, len(landmark_layout(KIND_POSE)), 3), dtype=np.float32)
+    coords[:, :, 0] = 0.5
+    decoded = decode(encode(FrameArrays(KIND_POSE, np.arange(3, dtype=np.int32), coords)))
+    np.testing.assert_array_equal(decoded.coords, coords)
+
+    empty = FrameArrays(KIND_HAND, np.zeros(0, dtype=np.int32), np.zeros((0, 42, 3), dtype=np.float32))
+    assert decode(encode(empty)).coords.shape == (0, 42, 3)
+
+
+def test_json_round_trip():
+    document = {"frames": [
+        {"frame_index": 3, "landmarks": {"right_hand": {"WRIST": {"x": 0.25, "y": 0.5, "z": -0.125, "visibility": 1}},
+                                         "left_hand": {}}},
+        {"frame_index": 4, "landmarks": {"right_hand": {}, "left_hand": {"THUMB_TIP": {"x": 0.75, "y": 0.0, "z": 0.0}}}},
+    ]}
+    decoded = decode(encode(FrameArrays.from_json(document, KIND_HAND), QUANT_FLOAT16))
+    for frame in document["frames"]:
+        frame["landmarks"]["right_hand"].get("WRIST", {}).pop("visibility", None)
+    assert decoded.to_json() == document
+
+
+def test_unknown_landmark_is_rejected():
+    with pytest.raises(ValueError, match="Unknown landmark"):
+        FrameArrays.from_json({"frames": [{"frame_index": 0, "landmarks": {"TAIL": {"x": 0}}}]}, KIND_POSE)
+
+
+def test_rejects_other_data():
+    with pytest.raises(ValueError):
+        decode(b"\0" * 64)
+    with pytest.raises(ValueError):
+        encode(make_frames(KIND_POSE), quantization=7)
@@ -0,0 +1,133 @@
+import os
+import pyarrow.parquet as pq
+import pytest
+from datasets import Dataset
+from gloss_cache import GlossCache, normalize_text
+from gloss_shards import ShardStore
+from gloss_validation import PARSE_FAILED, validate_glosses
+from synth_asl_gloss_asr_dataset import RETRY_SAMPLING_PARAMS, StubEngine, validate_and_retry
+
+SOURCE = "He hoped there would be stew for dinner turnips and carrots"
+
+
+@pytest.mark.parametrize("gloss, reason", [
+    ("DINNER STEW TURNIPS CARROTS HE HOPE", None),
+    ("fs-JOHN IX-he HOPE STEW++ DINNER?", None),
+    (PARSE_FAILED, "parse_failed"),
+    ("   ", "parse_failed"),
+    ("DINNER STEW HE HOPE\nNote: topic first", "multiline"),
+    ("Here is the gloss: he hoped there would be stew", "vocabulary"),
+    ("**DINNER** STEW HE HOPE", "vocabulary"),
+    ("HE HOPED THERE WOULD BE STEW FOR DINNER TURNIPS AND CARROTS", "echo"),
+    ("HE HOPED THERE WOULD BE STEW FOR DINNER, TURNIPS AND CARROTS.", "echo"),
+    ("HE HOPED THERE WOULD BE STEW DINNER TURNIPS AND CARROTS", "echo"),  # Copula kept, most words copied
+    (" ".join(["DINNER STEW HE HOPE"] * 5), "too_long"),
+    ("HE", "too_short"),
+])
+def test_reasons(gloss, reason):
+    assert validate_glosses([SOURCE], [gloss]) == [reason]
+
+
+def test_short_sentence_may_be_glossed_word_for_word():
+    assert validate_glosses(["Thank you."], ["THANK YOU"]) == [None]
+
+
+def test_first_failing_check_wins():
+    assert validate_glosses([SOURCE], ["Note: he hoped\nDINNER STEW"]) == ["multiline"]
+
+
+class ScriptedEngine:
+    """Answers each sentence with the next of its scripted glosses and records the calls."""
+
+    def __init__(self, answers):
+        self.answers = {text: list(glosses) for text, glosses in answers.items()}
+        self.calls = []
+
+    def generate(self, texts, sampling_overrides=None):
+        self.calls.append((list(texts), sampling_overrides))
+        return [self.answers[text].pop(0) for text in texts]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ShardStore(str(tmp_path / "shards"), 4, {"model": "test"})
+
+
+def read_shard(store, shard):
+    return pq.read_table(os.path.join(store.shard_dir, shard["file"])).to_pydict()
+
+
+def test_only_failing_records_are_regenerated(store, tmp_path):
+    texts = ["The dog is hungry", "Where is my coat", "She went to the store yesterday", "I like apples"]
+    store.write_shard(0, 4, [
+        "DOG HUNGRY",
+        "Here is the gloss: where is my coat",  # Fixed by the first retry
+        "SHE GO STORE YESTERDAY\nNote: past tense",  # Fixed by the second retry
+        "I LIKE APPLES",
+    ])
+    engine = ScriptedEngine({
+        "Where is my coat": ["MY COAT WHERE"],
+        "She went to the store yesterday": ["SHE WENT TO THE STORE YESTERDAY", "YESTERDAY STORE SHE GO"],
+    })
+    cache = GlossCache(str(tmp_path / "cache.sqlite"), "test")
+
+    failures, fixed, unfixed = validate_and_retry(store, Dataset.from_dict({"text": texts}), lambda: engine, cache)
+
+    assert (dict(failures), fixed, unfixed) == ({"vocabulary": 1, "multiline": 1}, 2, 0)
+    assert engine.calls == [
+        (["Where is my coat", "She went to the store yesterday"], RETRY_SAMPLING_PARAMS[0]),
+        (["She went to the store yesterday"], RETRY_SAMPLING_PARAMS[1]),
+    ]
+    shard = store.shards[0]
+    assert (shard["validated"], shard["invalid"]) == (True, 0)
+    assert read_shard(store, shard)["asl_gloss"] == ["DOG HUNGRY", "MY COAT WHERE", "YESTERDAY STORE SHE GO",
+                                                      "I LIKE APPLES"]
+    assert cache.get_many([normalize_text(text) for text in texts[1:3]]) == {
+        "where is my coat": "MY COAT WHERE", "she went to the store yesterday": "YESTERDAY STORE SHE GO"}
+
+
+def test_unfixed_records_keep_their_reason(store):
+    texts = ["The cat is on the mat today", "Good morning", "Thank you", "See you later"]
+    store.write_shard(0, 2, ["THE CAT IS ON THE MAT TODAY", "GOOD MORNING"])
+    store.write_shard(2, 4, ["THANK YOU", "SEE YOU LATER"])
+    engine = ScriptedEngine({texts[0]: ["THE CAT IS ON THE MAT TODAY"] * len(RETRY_SAMPLING_PARAMS)})
+
+    failures, fixed, unfixed = validate_and_retry(store, Dataset.from_dict({"text": texts}), lambda: engine)
+
+    assert (dict(failures), fixed, unfixed) == ({"echo": 1}, 0, 1)
+    first, second = store.shards
+    assert (first["validated"], first["invalid"], second["invalid"]) == (True, 1, 0)
+    assert read_shard(store, first) == {"index": [0, 1], "asl_gloss": ["THE CAT IS ON THE MAT TODAY", "GOOD MORNING"],
+                                        "asl_gloss_error": ["echo", None]}
+    assert read_shard(store, second)["asl_gloss_error"] == [None, None]
+
+
+def test_valid_and_validated_shards_are_left_alone(store):
+    texts = ["Good morning", "Thank you", "See you later", "The dog is hungry"]
+    store.write_shard(0, 4, ["GOOD MORNING", "THANK YOU", "SEE YOU LATER", "DOG HUNGRY"])
+
+    def get_engine():
+        raise AssertionError("no record failed, so no engine is needed")
+
+    dataset = Dataset.from_dict({"text": texts})
+    assert validate_and_retry(store, dataset, get_engine)[1:] == (0, 0)
+    assert store.shards[0]["validated"]
+
+    store.write_shard(0, 4, ["Here is the gloss"] * 4, validated=True, invalid=0)
+    assert validate_and_retry(store, dataset, get_engine)[1:] == (0, 0)
+
+
+def test_stub_failures_are_fixed_except_echoes(tmp_path):
+    texts = [f"The weather in city number {i} is cold and wet today" for i in range(64)]
+    engine = StubEngine(failure_every=4)
+    store = ShardStore(str(tmp_path / "shards"), len(texts), {"model": "stub"})
+    for start in range(0, len(texts), 16):
+        store.write_shard(start, start + 16, engine.generate(texts[start:start + 16]))
+
+    failures, fixed, unfixed = validate_and_retry(store, Dataset.from_dict({"text": texts}), lambda: engine)
+
+    assert fixed > 0 and unfixed > 0
+    assert fixed + unfixed == sum(failures.values())
+    errors = [error for shard in store.shards for error in read_shard(store, shard)["asl_gloss_error"]]
+    assert errors.count("echo") == unfixed == sum(shard["invalid"] for shard in store.shards)
+    assert set(errors) == {None, "echo"}
@@ -0,0 +1,109 @@
+import threading
+import time
+import pytest
+from inference_scheduler import (ClientDisconnectedError, DeadlineExceededError, MicroBatchScheduler,
+                                 QueueFullError)
+
+
+@pytest.fixture
+def blocked_scheduler():
+    """A scheduler whose worker is stuck in a batch until `release` is set."""
+    release = threading.Event()
+    started = threading.Event()
+    batches = []
+
+    def run_batch(payloads):
+        batches.append(list(payloads))
+        started.set()
+        release.wait(5)
+        return [payload * 10 for payload in payloads]
+
+    scheduler = MicroBatchScheduler(run_batch, max_batch_size=4, max_wait_ms=1, max_queue_size=2).start()
+    blocker = scheduler.submit_async(0)
+    assert started.wait(5)
+    yield scheduler, release, batches, blocker
+    release.set()
+    scheduler.stop()
+
+
+def test_results_go_back_to_their_callers():
+    scheduler = MicroBatchScheduler(lambda payloads: [payload * 2 for payload in payloads],
+                                    max_batch_size=8, max_wait_ms=20).start()
+    try:
+        futures = [scheduler.submit_async(i) for i in range(20)]
+        assert [future.result(5) for future in futures] == [i * 2 for i in range(20)]
+        assert scheduler.submit(21, timeout=5) == 42
+    finally:
+        scheduler.stop()
+
+
+def test_concurrent_requests_share_batches(blocked_scheduler):
+    scheduler, release, batches, blocker = blocked_scheduler
+    futures = [scheduler.submit_async(i) for i in (1, 2)]
+    release.set()
+    assert [future.result(5) for future in futures] == [10, 20]
+    assert batches == [[0], [1, 2]]
+
+
+def test_full_queue_rejects_with_retry_after(blocked_scheduler):
+    scheduler, release, _, _ = blocked_scheduler
+    queued = [scheduler.submit_async(i) for i in (1, 2)]
+    assert scheduler.depth() == 2
+    with pytest.raises(QueueFullError) as excinfo:
+        scheduler.submit_async(3)
+    assert excinfo.value.retry_after >= 1
+    assert scheduler.rejected == 1
+
+    release.set()
+    assert [future.result(5) for future in queued] == [10, 20]
+
+
+def test_expired_job_is_dropped_before_it_runs(blocked_scheduler):
+    scheduler, release, batches, _ = blocked_scheduler
+    expired = scheduler.submit_async(1, deadline=time.monotonic() - 1)
+    live = scheduler.submit_async(2, deadline=time.monotonic() + 60)
+    release.set()
+    with pytest.raises(DeadlineExceededError):
+        expired.result(5)
+    assert live.result(5) == 20
+    assert scheduler.dropped_deadline == 1
+    assert [1 in batch for batch in batches] == [False, False]
+
+
+def test_disconnected_client_is_dropped_before_it_runs(blocked_scheduler):
+    scheduler, release, batches, _ = blocked_scheduler
+    gone = scheduler.submit_async(1, is_alive=lambda: False)
+    live = scheduler.submit_async(2, is_alive=lambda: True)
+    release.set()
+    with pytest.raises(ClientDisconnectedError):
+        gone.result(5)
+    assert live.result(5) == 20
+    assert scheduler.dropped_disconnected == 1
+    assert batches[-1] == [2]
+
+
+def test_exclusive_job_runs_alone_between_batches(blocked_scheduler):
+    scheduler, release, batches, _ = blocked_scheduler
+    scheduler.max_wait_s = 1.0  # Long enough that the exclusive job would be batched if it could be
+    first = scheduler.submit_async(1)
+    exclusive = scheduler.submit_async(lambda: ["streamed"], exclusive=True)
+    release.set()
+    assert first.result(5) == 10
+    assert exclusive.result(5) == ["streamed"]
+    last = scheduler.submit_async(2)
+    assert last.result(5) == 20
+    assert batches == [[0], [1], [2]]
+
+
+def test_batch_error_fails_every_job_in_the_batch():
+    def run_batch(payloads):
+        raise RuntimeError("out of memory")
+
+    scheduler = MicroBatchScheduler(run_batch, max_batch_size=4, max_wait_ms=20).start()
+    try:
+        futures = [scheduler.submit_async(i) for i in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="out of memory"):
+                future.result(5)
+    finally:
+        scheduler.stop()
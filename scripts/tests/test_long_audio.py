@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from long_audio import merge_overlapping, overlap_words, split_windows, stitch_transcripts
+
+
+def result(text):
+    return {"text": text, "asl_gloss": text.upper()}
+
+
+def test_short_audio_is_one_window():
+    audio = np.zeros(16000 * 10, dtype=np.float32)
+    windows = split_windows(audio, window_s=30, overlap_s=4)
+    assert len(windows) == 1 and len(windows[0]) == len(audio)
+
+
+def test_windows_overlap_and_cover_the_audio():
+    audio = np.arange(16000 * 70, dtype=np.float32)
+    windows = split_windows(audio, window_s=30, overlap_s=4)
+    assert [int(window[0]) // 16000 for window in windows] == [0, 26, 52]
+    assert int(windows[-1][-1]) == len(audio) - 1
+    assert all(np.shares_memory(window, audio) for window in windows)
+
+
+def test_window_must_be_longer_than_overlap():
+    with pytest.raises(ValueError):
+        split_windows(np.zeros(16000), window_s=4, overlap_s=4)
+
+
+def test_repeated_boundary_words_are_kept_once():
+    merged = merge_overlapping("the cat sat on".split(), "sat on the mat".split())
+    assert merged == "the cat sat on the mat".split()
+
+
+def test_match_ignores_case_and_punctuation():
+    merged = merge_overlapping("we went home.".split(), "Went home, then".split())
+    assert merged == "we went home. then".split()
+
+
+def test_garbled_edge_word_is_dropped():
+    # Each window edge cut a word: "tomor" at the end of one, "row" at the start of the next
+    merged = merge_overlapping("i will see you tomor".split(), "row see you tomorrow at noon".split())
+    assert merged == "i will see you tomorrow at noon".split()
+    merged = merge_overlapping("we will see you tomor".split(), "see you tomorrow then".split())
+    assert merged == "we will see you tomorrow then".split()
+
+
+def test_match_away_from_the_boundary_is_kept():
+    assert merge_overlapping("a b c d e".split(), "b c x y".split()) == "a b c d e b c x y".split()
+
+
+def test_single_word_match_is_not_merged():
+    assert merge_overlapping("yes".split(), "yes".split()) == ["yes", "yes"]
+
+
+def test_overlap_is_bounded_by_the_window_share():
+    assert overlap_words(30, 4 / 30) == 4
+    assert overlap_words(200, 0.5) == 12
+    assert overlap_words(2, 0.01) == 1
+
+
+def test_stitch_merges_text_and_gloss():
+    stitched = stitch_transcripts([result("one two three four"), result("three four five six"),
+                                   result("five six seven")], overlap_fraction=0.5)
+    assert stitched == {"text": "one two three four five six seven",
+                        "asl_gloss": "ONE TWO THREE FOUR FIVE SIX SEVEN"}
+
+
+def test_genuinely_repeated_speech_is_kept():
+    results = [result("hello how you")] * 3
+    assert stitch_transcripts(results, overlap_fraction=4 / 30)["text"] == "hello how you " * 2 + "hello how you"
+
+
+def test_stitch_handles_empty_windows():
+    assert stitch_transcripts([result("hello there"), result(""), result("bye")]) == result("hello there bye")
+    assert stitch_transcripts([]) == {"text": "", "asl_gloss": ""}
@@ -0,0 +1,94 @@
+import json
+import numpy as np
+import pytest
+import response_cache
+from response_cache import ResponseCache, audio_fingerprint, make_cache_key
+
+PARAMS = {"backend": "stub", "model": "stub", "max_new_tokens": 256}
+
+
+@pytest.fixture
+def audio():
+    return np.random.default_rng(0).uniform(-0.5, 0.5, 16000).astype(np.float32)
+
+
+def test_key_ignores_gain(audio):
+    assert make_cache_key(audio * 0.25, "Transcribe.", PARAMS) == make_cache_key(audio, "Transcribe.", PARAMS)
+
+
+def test_key_depends_on_audio_prompt_and_params(audio):
+    key = make_cache_key(audio, "Transcribe.", PARAMS)
+    assert make_cache_key(audio[:-1], "Transcribe.", PARAMS) != key
+    assert make_cache_key(audio, "Transcribe this.", PARAMS) != key
+    assert make_cache_key(audio, "Transcribe.", {**PARAMS, "model": "other"}) != key
+    assert make_cache_key(audio, "Transcribe.", dict(reversed(PARAMS.items()))) == key
+
+
+def test_silence_and_empty_audio_have_fingerprints():
+    assert audio_fingerprint(np.zeros(0, dtype=np.float32)) != audio_fingerprint(np.zeros(16, dtype=np.float32))
+
+
+def entry_bytes(key, value):
+    return ResponseCache._entry_size(key, json.dumps(value))
+
+
+def test_evicts_least_recently_used_by_bytes():
+    value = {"text": "hello", "asl_gloss": "HELLO"}
+    cache = ResponseCache(max_bytes=3 * entry_bytes("a", value))
+    for key in "abc":
+        cache.put(key, value)
+    assert cache.get("a") == value  # "b" is now the oldest
+    cache.put("d", value)
+
+    assert cache.get("b") is None
+    assert [cache.get(key) == value for key in "acd"] == [True] * 3
+    stats = cache.stats()
+    assert (stats["evictions"], stats["entries"], stats["bytes"]) == (1, 3, cache.max_bytes)
+    assert (stats["hits"], stats["misses"]) == (4, 1)
+
+
+def test_oversized_entry_is_not_stored():
+    cache = ResponseCache(max_bytes=16)
+    cache.put("key", {"text": "far too long for this cache"})
+    assert cache.get("key") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_returned_values_are_copies():
+    cache = ResponseCache()
+    cache.put("key", {"text": "hello"})
+    cache.get("key")["text"] = "changed"
+    assert cache.get("key") == {"text": "hello"}
+
+
+def test_persisted_entries_reload_in_recency_order(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    value = {"text": "hello", "asl_gloss": "HELLO"}
+    cache = ResponseCache(max_bytes=3 * entry_bytes("a", value), persist_path=path)
+    for key in "abc":
+        cache.put(key, value)
+    cache.get("a")
+    cache.flush()
+
+    # Room for two entries: the two most recently used ones come back
+    reloaded = ResponseCache(max_bytes=2 * entry_bytes("a", value), persist_path=path)
+    assert reloaded.get("b") is None
+    assert reloaded.get("a") == value and reloaded.get("c") == value
+    assert ResponseCache(persist_path=path).stats()["entries"] == 2  # The dropped entry was deleted
+
+
+def test_hits_reach_disk_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "RECENCY_FLUSH_EVERY", 2)
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(persist_path=path)
+    cache.put("a", {"text": "a"})
+    cache.put("b", {"text": "b"})
+
+    def last_used(key):
+        return cache._db.execute("SELECT last_used FROM responses WHERE key = ?", (key,)).fetchone()[0]
+
+    written = last_used("a")
+    cache.get("a")
+    assert last_used("a") == written
+    cache.get("b")
+    assert last_used("a") > written
@@ -1,80 +1,433 @@
 # main.py
-import re
 import os
-import gc
-import tempfile
-from flask import Flask, request, jsonify
-from unsloth import FastModel
-import torch
-from transformers import TextStreamer
+import json
+import time
+import atexit
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+import numpy as np
+from flask import Flask, Response, request, jsonify, stream_with_context
+from audio_io import TARGET_SAMPLE_RATE, AudioDecodeError, decode_audio, normalize_loudness, trim_silence
+from memory_policy import MemoryPolicy, allocator_stats, resolve_device
+from gemma_inference import (
+    MAX_NEW_TOKENS,
+    MIN_NEW_TOKENS,
+    SAMPLING_PARAMS,
+    TOKENS_PER_AUDIO_SECOND,
+    AslStreamParser,
+    audio_duration,
+    build_messages,
+    max_new_tokens_for_audio,
+    parse_asl_response,
+)
+from inference_scheduler import (
+    ClientDisconnectedError,
+    MicroBatchScheduler,
+    QueueFullError,
+)
+from gloss_lexicon import SignLexicon
+from inference_backends import create_backend
+from long_audio import split_windows, stitch_transcripts
+from response_cache import ResponseCache, make_cache_key
+from server_metrics import RequestTimer, ServerMetrics
 
-# --- Configuration & Model Loading ---
-# This section loads the model and tokenizer once when the application starts.
-# This is much more efficient than reloading the model for every API request.
+PROCESS_STARTED = time.perf_counter()
 
-print("Loading model... This may take a few minutes.")
+# --- Logging ---
+# GEMMA_LOG_LEVEL=DEBUG also logs prompts and generated text; WARNING silences
+# the per-request lines, including the Flask dev server's access log (werkzeug
+# sets its logger to INFO unless it already has a level).
+LOG_LEVEL = os.environ.get("GEMMA_LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("werkzeug").setLevel(LOG_LEVEL)
+logger = logging.getLogger("gemma_api")
+
+# --- Configuration & Backend ---
+# The model is loaded once, on a background thread, so the HTTP server can bind
+# immediately (see "Startup" below). GEMMA_BACKEND picks how it is run (see
+# inference_backends.py): "unsloth" (default, CUDA), "cpu" (the merged export,
+# int8-quantized on CPU) or "stub" (the CPU stub model, with
+# GEMMA_STUB_PER_TOKEN_DELAY_MS / GEMMA_STUB_PREFILL_DELAY_MS per prompt token
+# standing in for GPU time; used by benchmark_server.py).
 
 # MODEL_NAME = "unsloth_gemma-3n-E2B-it-unsloth-bnb-4bit"
 MODEL_NAME = "gemma-3n"
 MAX_SEQ_LENGTH = 1024 # Adjust as needed for your context length requirements
 
-# Load the model with 4-bit quantization
-try:
-    model, tokenizer = FastModel.from_pretrained(
-        model_name=MODEL_NAME,
-        dtype=None,  # Auto-detection
-        max_seq_length=MAX_SEQ_LENGTH,
-#        load_in_4bit=True,
-#        full_finetuning=False,
-    )
-    print(model)
-    print("Model loaded successfully.")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    # Exit if the model fails to load
-    exit()
+BACKEND = os.environ.get("GEMMA_BACKEND", "unsloth")
+BACKEND_OPTIONS = {
+    "unsloth": {"model_name": MODEL_NAME, "max_seq_length": MAX_SEQ_LENGTH},
+    "cpu": {
+        "model_path": os.environ.get("GEMMA_CPU_MODEL_PATH", MODEL_NAME),
+        "quantization": os.environ.get("GEMMA_CPU_QUANTIZATION", "int8"),
+        "threads": int(os.environ.get("GEMMA_CPU_THREADS", 0)),
+    },
+    "stub": {
+        "per_token_delay_s": float(os.environ.get("GEMMA_STUB_PER_TOKEN_DELAY_MS", 5)) / 1000,
+        "prefill_delay_s": float(os.environ.get("GEMMA_STUB_PREFILL_DELAY_MS", 0)) / 1000,
+    },
+}
+
+backend = create_backend(
+    BACKEND, resolve_device(os.environ.get("GEMMA_DEVICE", "auto")), **BACKEND_OPTIONS.get(BACKEND, {}),
+)
 
 # Initialize Flask App
 app = Flask(__name__)
+metrics = ServerMetrics()
+
+# --- Long Audio ---
+# Uploads longer than GEMMA_LONG_AUDIO_WINDOW_S seconds (0 disables this) are
+# transcribed by /transcribe as overlapping windows (GEMMA_LONG_AUDIO_OVERLAP_S)
+# run together in one batch, and the window transcripts are stitched back into
+# a single response.
+LONG_AUDIO_WINDOW_S = float(os.environ.get("GEMMA_LONG_AUDIO_WINDOW_S", 30))
+LONG_AUDIO_OVERLAP_S = float(os.environ.get("GEMMA_LONG_AUDIO_OVERLAP_S", 4))
+
+# --- Micro-Batching & Admission Control ---
+# Concurrent /transcribe requests are gathered into one padded batch and run
+# through a single `generate` call on a dedicated inference worker thread.
+# At most GEMMA_MAX_QUEUE_SIZE requests may wait; beyond that the server answers
+# 503 with a Retry-After header. Requests are dropped before they reach the
+# model once their deadline (GEMMA_REQUEST_TIMEOUT_S, or a shorter
+# X-Request-Timeout header in seconds) has passed or their client disconnected.
+BATCH_MAX_SIZE = int(os.environ.get("GEMMA_BATCH_MAX_SIZE", 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get("GEMMA_BATCH_MAX_WAIT_MS", 10))
+MAX_QUEUE_SIZE = int(os.environ.get("GEMMA_MAX_QUEUE_SIZE", 64))
+REQUEST_TIMEOUT_S = float(os.environ.get("GEMMA_REQUEST_TIMEOUT_S", 60))
+
+# --- Server ---
+# "flask" runs the built-in development server; "waitress" runs a production
+# WSGI server with a fixed pool of request threads that also reports client
+# disconnects.
+SERVER = os.environ.get("GEMMA_SERVER", "flask")
+SERVER_THREADS = int(os.environ.get("GEMMA_SERVER_THREADS", 16))
+PORT = int(os.environ.get("GEMMA_PORT", 5000))
+
+# --- Device & Memory Policy ---
+# Cached GPU memory is only released once reserved memory passes the high-water
+# mark (a fraction of total device memory) or, if set, every N requests.
+DEVICE = backend.device
+MEMORY_HIGH_WATER_FRACTION = float(os.environ.get("GEMMA_MEMORY_HIGH_WATER_FRACTION", 0.9))
+MEMORY_RECLAIM_EVERY = int(os.environ.get("GEMMA_MEMORY_RECLAIM_EVERY", 0))
+
+memory_policy = MemoryPolicy(
+    DEVICE,
+    high_water_fraction=MEMORY_HIGH_WATER_FRACTION,
+    reclaim_every=MEMORY_RECLAIM_EVERY,
+)
 
-# --- Helper Function for Inference ---
-# This function is adapted to return the generated text instead of streaming to the console.
-def do_gemma_3n_inference(model, tokenizer, messages, max_new_tokens=256):
+# --- Prompt-Prefix KV Cache ---
+# The shared system turn is prefilled once at startup and its past-key-values
+# reused by single-row generations and by batches without padding (see
+# prefix_cache.py). GEMMA_PREFIX_CACHE_SIZE bounds how many distinct prefixes
+# are kept (0 disables the cache).
+PREFIX_CACHE_SIZE = int(os.environ.get("GEMMA_PREFIX_CACHE_SIZE", 4))
+# The prompt the Flutter app sends with every request
+APP_PROMPT = "Please transcribe this audio and concat with it's ASL gloss with <ASL> </ASL> tag"
+
+prefix_cache = None  # Built once the model is loaded
+
+# --- Token Budget ---
+# Generation stops at the closing </ASL> tag. Its token budget is
+# GEMMA_TOKENS_PER_AUDIO_SECOND per second of (trimmed) audio, clamped between
+# GEMMA_MIN_NEW_TOKENS and GEMMA_MAX_NEW_TOKENS; a batch gets the budget of its
+# longest clip.
+MAX_NEW_TOKENS_LIMIT = int(os.environ.get("GEMMA_MAX_NEW_TOKENS", MAX_NEW_TOKENS))
+MIN_NEW_TOKENS_LIMIT = int(os.environ.get("GEMMA_MIN_NEW_TOKENS", MIN_NEW_TOKENS))
+TOKENS_PER_SECOND_BUDGET = float(os.environ.get("GEMMA_TOKENS_PER_AUDIO_SECOND", TOKENS_PER_AUDIO_SECOND))
+
+def token_budget(batch_messages):
+    return max(
+        max_new_tokens_for_audio(audio_duration(messages), TOKENS_PER_SECOND_BUDGET,
+                                 MIN_NEW_TOKENS_LIMIT, MAX_NEW_TOKENS_LIMIT)
+        for messages in batch_messages
+    )
+
+def after_generation(stats):
+    # Rows that ran out of the audio-based budget were cut short of the fixed limit
+    for row in stats.get("rows", ()):
+        row["budget_cut_steps"] = (
+            max(0, MAX_NEW_TOKENS_LIMIT - stats["max_new_tokens"]) if row["stop_reason"] == "budget" else 0
+        )
+    metrics.observe_generation(stats)
+    report = memory_policy.after_inference(stats.get("batch_size", 1))
+    if report is not None:
+        logger.info(f"Memory reclaimed ({report['reason']}): before={report['before']} after={report['after']}")
+
+# Both functions below run on the scheduler's worker thread, the only thread
+# that touches the model.
+def run_inference_batch(batch_messages):
     """
-    Performs inference on the provided messages, captures the generated text, and returns it.
+    Runs a batch of chat messages through the model and returns one
+    `(parsed {"text", "asl_gloss"} dict, stats)` pair per request: the batch
+    stats plus that request's row (see `request_stats`).
     """
-    # Apply the chat template to format the input correctly
-    inputs = tokenizer.apply_chat_template(
-        messages,
-        add_generation_prompt=True,  # Crucial for generation tasks
-        tokenize=True,
-        return_dict=True,
-        return_tensors="pt",
-    ).to("cuda")
-
-    # Generate the text output
-    # We remove the streamer to capture the output instead of printing it
-    outputs = model.generate(
-        **inputs,
-        max_new_tokens=max_new_tokens,
-        temperature=1.0,
-        top_p=0.95,
-        top_k=64,
-        use_cache=True, # Important for generation speed
+    stats = {}
+    generated_texts = backend.generate_batch(
+        batch_messages, token_budget(batch_messages), prefix_cache=prefix_cache, stats=stats,
     )
-    
-    # Decode the generated tokens into a string
-    # We decode only the newly generated tokens, skipping the input prompt
-    generated_text = tokenizer.batch_decode(outputs[:, inputs.input_ids.shape[1]:], skip_special_tokens=True)[0]
-    print(generated_text)
-
-    # Cleanup to reduce VRAM usage after each inference
-    del inputs
-    del outputs
-    torch.cuda.empty_cache()
-    gc.collect()
-    
-    return generated_text
+    parse_started = time.perf_counter()
+    for generated_text in generated_texts:
+        logger.debug(f"Generated Description: {generated_text}")
+    results = [parse_asl_response(generated_text) for generated_text in generated_texts]
+    stats["parse"] = time.perf_counter() - parse_started
+    after_generation(stats)
+    return [(result, request_stats(stats, row)) for row, result in enumerate(results)]
+
+def request_stats(stats, row):
+    """The batch `stats` with the `rows` entry replaced by row `row`'s stop reason and saved steps."""
+    request = {key: value for key, value in stats.items() if key != "rows"}
+    request.update(stats["rows"][row])
+    return request
+
+def run_chunked(batch_messages):
+    """
+    Runs the windows of one long recording, BATCH_MAX_SIZE at a time, and
+    returns the stitched `{"text", "asl_gloss"}` result with the summed stats.
+    """
+    results, stats = [], {}
+    for start in range(0, len(batch_messages), BATCH_MAX_SIZE):
+        outputs = run_inference_batch(batch_messages[start:start + BATCH_MAX_SIZE])
+        results.extend(result for result, _ in outputs)
+        for key, value in outputs[0][1].items():
+            if key in ("tag_saved_steps", "budget_cut_steps"):
+                value = sum(window_stats[key] for _, window_stats in outputs)
+            elif key == "stop_reason":
+                continue
+            stats[key] = stats.get(key, 0) + value
+    stitch_started = time.perf_counter()
+    result = stitch_transcripts(results, LONG_AUDIO_OVERLAP_S / LONG_AUDIO_WINDOW_S)
+    stats["parse"] += time.perf_counter() - stitch_started
+    stats["chunks"] = len(batch_messages)
+    return result, stats
+
+def run_exclusive(fn, stats):
+    result = fn()
+    after_generation(stats)
+    stats.update(request_stats(stats, 0))
+    del stats["rows"]
+    return result
+
+scheduler = MicroBatchScheduler(
+    run_inference_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_queue_size=MAX_QUEUE_SIZE,
+).start()
+metrics.bind_queue_depth(scheduler.depth)
+metrics.bind_gpu_memory(lambda: allocator_stats(DEVICE))
+metrics.add_gauge_function("gemma_rejected_requests", "Requests rejected with 503 because the queue was full",
+                           lambda: scheduler.rejected)
+metrics.add_gauge_function("gemma_dropped_requests", "Queued requests dropped for a passed deadline or disconnect",
+                           lambda: scheduler.dropped_deadline + scheduler.dropped_disconnected)
+
+# --- Startup: Lazy Loading, Warmup & Readiness ---
+# The model loads in the background while the server already answers
+# /healthz (process is up and loading has not failed) and /readyz (model loaded
+# and warmed up). Before serving traffic, a few synthetic generations over the
+# audio lengths in GEMMA_WARMUP_SECONDS (comma separated, empty to skip) trigger
+# CUDA kernel compilation and autotuning so the first real request doesn't.
+WARMUP_SECONDS = [float(value) for value in os.environ.get("GEMMA_WARMUP_SECONDS", "1,4,10").split(",") if value.strip()]
+WARMUP_MAX_NEW_TOKENS = int(os.environ.get("GEMMA_WARMUP_MAX_NEW_TOKENS", 16))
+
+startup = {"backend": BACKEND, "state": "loading", "error": None, "model_load_s": None, "warmup_s": None, "ready_s": None}
+model_ready = threading.Event()
+first_request_logged = threading.Event()
+
+def load_model():
+    """Loads the model, builds the prefix cache and runs the warmup generations."""
+    global prefix_cache
+
+    logger.info(f"Loading model with the {BACKEND} backend... This may take a few minutes.")
+    load_started = time.perf_counter()
+    try:
+        backend.load()
+        logger.debug("%s", backend.model)
+        startup["model_load_s"] = time.perf_counter() - load_started
+        logger.info(f"Model loaded successfully in {startup['model_load_s']:.1f}s.")
+
+        startup["state"] = "warming_up"
+        warmup_started = time.perf_counter()
+        prefix_cache = backend.make_prefix_cache(PREFIX_CACHE_SIZE)
+        if prefix_cache is not None:
+            prefix_cache.warm(build_messages(np.zeros(16000, dtype=np.float32), APP_PROMPT))
+
+        rng = np.random.default_rng(0)
+        for seconds in WARMUP_SECONDS:
+            audio = (rng.standard_normal(int(seconds * 16000)) * 0.01).astype(np.float32)
+            started = time.perf_counter()
+            backend.generate_batch([build_messages(audio, APP_PROMPT)], WARMUP_MAX_NEW_TOKENS, prefix_cache=prefix_cache)
+            logger.info(f"Warmup generation for {seconds:g}s of audio took {time.perf_counter() - started:.2f}s")
+        if WARMUP_SECONDS:
+            # Also imports and exercises the streaming path used by /transcribe_stream
+            audio = np.zeros(int(WARMUP_SECONDS[0] * 16000), dtype=np.float32)
+            for _ in backend.stream(build_messages(audio, APP_PROMPT), WARMUP_MAX_NEW_TOKENS, prefix_cache=prefix_cache):
+                pass
+        startup["warmup_s"] = time.perf_counter() - warmup_started
+    except Exception as e:
+        startup["state"] = "failed"
+        startup["error"] = str(e)
+        logger.error(f"Error loading model: {e}")
+        return
+
+    startup["ready_s"] = time.perf_counter() - PROCESS_STARTED
+    startup["state"] = "ready"
+    model_ready.set()
+    logger.info(
+        f"Server ready {startup['ready_s']:.1f}s after start "
+        f"(model load {startup['model_load_s']:.1f}s, warmup {startup['warmup_s']:.1f}s)"
+    )
+
+metrics.add_gauge_function("gemma_ready", "1 once the model is loaded and warmed up",
+                           lambda: 1 if model_ready.is_set() else 0)
+metrics.add_gauge_function("gemma_model_load_seconds", "Time taken to load the model",
+                           lambda: startup["model_load_s"] or 0)
+metrics.add_gauge_function("gemma_warmup_seconds", "Time taken by the warmup generations",
+                           lambda: startup["warmup_s"] or 0)
+
+threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+
+def log_first_request(timer, status):
+    if status == 200 and not first_request_logged.is_set():
+        first_request_logged.set()
+        logger.info(
+            f"First request served in {timer.total() * 1000:.1f}ms, "
+            f"{time.perf_counter() - PROCESS_STARTED:.1f}s after start"
+        )
+
+def not_ready_response(timer):
+    if startup["state"] == "failed":
+        return finish_request(timer, {"error": f"Model failed to load: {startup['error']}"}, 503)
+    return finish_request(timer, {"error": "Model is still loading"}, 503, {"Retry-After": "5"})
+
+def request_deadline():
+    """Monotonic deadline for the current request."""
+    timeout = REQUEST_TIMEOUT_S
+    try:
+        timeout = min(timeout, float(request.headers.get("X-Request-Timeout", timeout)))
+    except ValueError:
+        pass
+    return time.monotonic() + timeout
+
+def client_liveness():
+    """A callable reporting whether the client is still connected, if the server can tell."""
+    client_disconnected = request.environ.get("waitress.client_disconnected")
+    if client_disconnected is None:
+        return None
+    return lambda: not client_disconnected()
+
+def finish_request(timer, payload, status=200, headers=None):
+    """Serializes the JSON response, then records the request's timings and metrics."""
+    response = jsonify(payload)
+    response.status_code = status
+    if headers:
+        response.headers.update(headers)
+    timer.lap("serialize")
+    metrics.observe_request(timer, status)
+    logger.info(timer.as_log(status))
+    log_first_request(timer, status)
+    return response
+
+def queue_full_response(timer, e):
+    logger.warning(f"Rejected: {e}")
+    return finish_request(timer, {"error": "Server is busy, please retry later"}, 503,
+                          {"Retry-After": str(e.retry_after)})
+
+# --- Audio Preprocessing ---
+# Before the messages are built, leading and trailing silence quieter than
+# GEMMA_SILENCE_THRESHOLD_DB dBFS is trimmed (keeping GEMMA_SILENCE_PAD_MS around
+# the speech) and the level is normalized to GEMMA_TARGET_LOUDNESS_DBFS RMS,
+# with at most GEMMA_MAX_GAIN_DB of gain. Uploads are already 16 kHz mono after
+# decoding. GEMMA_TRIM_SILENCE=0 / GEMMA_NORMALIZE_LOUDNESS=0 turn either step off.
+TRIM_SILENCE = os.environ.get("GEMMA_TRIM_SILENCE", "1") == "1"
+SILENCE_THRESHOLD_DB = float(os.environ.get("GEMMA_SILENCE_THRESHOLD_DB", -45))
+SILENCE_PAD_MS = float(os.environ.get("GEMMA_SILENCE_PAD_MS", 200))
+NORMALIZE_LOUDNESS = os.environ.get("GEMMA_NORMALIZE_LOUDNESS", "1") == "1"
+TARGET_LOUDNESS_DBFS = float(os.environ.get("GEMMA_TARGET_LOUDNESS_DBFS", -20))
+MAX_GAIN_DB = float(os.environ.get("GEMMA_MAX_GAIN_DB", 20))
+
+def preprocess_audio(audio, timer=None):
+    """Trims silence and normalizes loudness, recording both durations on `timer` (if given) and in the metrics."""
+    original_s = len(audio) / TARGET_SAMPLE_RATE
+    if TRIM_SILENCE:
+        audio = trim_silence(audio, TARGET_SAMPLE_RATE, SILENCE_THRESHOLD_DB, pad_ms=SILENCE_PAD_MS)
+    if NORMALIZE_LOUDNESS:
+        audio = normalize_loudness(audio, TARGET_LOUDNESS_DBFS, MAX_GAIN_DB)
+    trimmed_s = len(audio) / TARGET_SAMPLE_RATE
+    if timer is not None:
+        timer.lap("preprocess")
+        timer.set_audio_duration(original_s, trimmed_s)
+    metrics.observe_audio(original_s, trimmed_s)
+    return audio
+
+# --- Response Cache ---
+# Repeated utterances are answered from an LRU cache bounded in bytes
+# (0 disables it). Set GEMMA_RESPONSE_CACHE_PATH to keep entries across restarts.
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("GEMMA_RESPONSE_CACHE_MAX_BYTES", 16 * 2**20))
+RESPONSE_CACHE_PATH = os.environ.get("GEMMA_RESPONSE_CACHE_PATH")
+GENERATION_PARAMS = {
+    "backend": BACKEND,
+    # The checkpoint and how it is quantized change the output; stub delays and thread counts do not
+    **{key: value for key, value in BACKEND_OPTIONS.get(BACKEND, {}).items()
+       if key in ("model_name", "model_path", "quantization")},
+    **SAMPLING_PARAMS,
+    "max_new_tokens": MAX_NEW_TOKENS_LIMIT,
+    "min_new_tokens": MIN_NEW_TOKENS_LIMIT,
+    "tokens_per_audio_second": TOKENS_PER_SECOND_BUDGET,
+    "long_audio_window_s": LONG_AUDIO_WINDOW_S,
+    "long_audio_overlap_s": LONG_AUDIO_OVERLAP_S,
+}
+
+response_cache = (
+    ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_PATH) if RESPONSE_CACHE_MAX_BYTES > 0 else None
+)
+
+def cache_lookup(audio, prompt):
+    """Returns `(key, cached_result)`; both are None when the cache is disabled."""
+    if response_cache is None:
+        return None, None
+    key = make_cache_key(audio, prompt, GENERATION_PARAMS)
+    return key, response_cache.get(key)
+
+if response_cache is not None:
+    atexit.register(response_cache.flush)
+    metrics.add_gauge_function("gemma_response_cache_hits", "Response cache hits", lambda: response_cache.hits)
+    metrics.add_gauge_function("gemma_response_cache_misses", "Response cache misses", lambda: response_cache.misses)
+
+def inference_payload(audio, prompt):
+    """
+    Returns the scheduler payload for one clip and whether it is an exclusive
+    job: a long recording becomes one job that runs all of its windows as a batch.
+    """
+    windows = split_windows(audio, LONG_AUDIO_WINDOW_S, LONG_AUDIO_OVERLAP_S) if LONG_AUDIO_WINDOW_S > 0 else [audio]
+    if len(windows) > 1:
+        batch_messages = [build_messages(window, prompt) for window in windows]
+        return (lambda: run_chunked(batch_messages)), True
+    return build_messages(audio, prompt), False
+
+# --- Gloss Resolution ---
+# With a sign inventory configured (GEMMA_LEXICON_DB, a SignLanguage.db, or
+# GEMMA_LEXICON_ASSETS, the assets/signs directory), responses carry a
+# `playback_plan` resolving every gloss word to the signs to play: word signs,
+# lemma fallbacks, numbers and fingerspelling. See gloss_lexicon.py.
+LEXICON_DB = os.environ.get("GEMMA_LEXICON_DB")
+LEXICON_ASSETS = os.environ.get("GEMMA_LEXICON_ASSETS")
+
+lexicon = None
+if LEXICON_DB:
+    lexicon = SignLexicon.from_database(LEXICON_DB)
+elif LEXICON_ASSETS:
+    lexicon = SignLexicon.from_assets(LEXICON_ASSETS)
+if lexicon is not None:
+    logger.info(f"Sign lexicon loaded with {len(lexicon)} signs")
+
+def with_playback_plan(result):
+    """Adds the playback plan for `result["asl_gloss"]` when a lexicon is loaded."""
+    if lexicon is None:
+        return result
+    return {**result, "playback_plan": lexicon.resolve(result["asl_gloss"])}
 
 # --- API Endpoint ---
 @app.route('/transcribe', methods=['POST'])
@@ -87,75 +440,376 @@ def transcribe_audio():
     - A file part named 'audio' containing the audio file.
     - A form field named 'prompt' with the text question (e.g., "What is this audio about?").
     """
+    timer = RequestTimer("/transcribe")
+    if not model_ready.is_set():
+        return not_ready_response(timer)
+
     # Check if the audio file is in the request
     if 'audio' not in request.files:
-        return jsonify({"error": "No audio file provided"}), 400
+        return finish_request(timer, {"error": "No audio file provided"}, 400)
 
     audio_file = request.files['audio']
     
     # Check if the filename is empty
     if audio_file.filename == '':
-        return jsonify({"error": "No audio file selected"}), 400
+        return finish_request(timer, {"error": "No audio file selected"}, 400)
 
     # Get the text prompt from the form data
     prompt = request.form.get('prompt', "What is this audio about?")
 
-    # Create a temporary file to save the uploaded audio
-    # Using a context manager ensures the file is deleted automatically
+    # Decode the upload in memory into a 16 kHz float32 array
     try:
-        with tempfile.NamedTemporaryFile(delete=True, suffix=os.path.splitext(audio_file.filename)[1]) as temp_audio:
-            audio_file.save(temp_audio.name)
-            
-            print(f"Processing audio file: {audio_file.filename} with prompt: '{prompt}'")
-
-            # Prepare the messages payload for the model
-            messages = [
-            {
-                "role": "system",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "You are an assistant that transcribes speech accurately.",
-                    }
-                ],
-            },
-            {
-                "role": "user",
-                "content": [
-                    {"type": "audio", "audio": temp_audio.name},
-                    {"type": "text",  "text": prompt}
-                ]
-            }]
-            print(messages)
-
-            # Run inference
+        audio_bytes = audio_file.read()
+        timer.lap("receive")
+        audio = decode_audio(audio_bytes)
+        timer.lap("decode_audio")
+        audio = preprocess_audio(audio, timer)
+    except AudioDecodeError as e:
+        logger.warning(f"File Handling Error: {e}")
+        return finish_request(timer, {"error": f"An error occurred processing the file: {e}"}, 400)
+    except Exception as e:
+        logger.error(f"File Handling Error: {e}")
+        return finish_request(timer, {"error": f"An error occurred processing the file: {e}"}, 500)
+
+    logger.debug(f"Processing audio file: {audio_file.filename} ({timer.audio_s:.2f}s, {timer.trimmed_audio_s:.2f}s after trimming) with prompt: '{prompt}'")
+
+    # Repeated utterances skip the model entirely
+    cache_key, result = cache_lookup(audio, prompt)
+    if result is not None:
+        logger.debug(f"Cache hit: {result}")
+        return finish_request(timer, with_playback_plan(result))
+
+    # Prepare the messages payload for the model
+    payload, exclusive = inference_payload(audio, prompt)
+
+    # Run inference; the scheduler batches this with other concurrent requests
+    deadline = request_deadline()
+    try:
+        future = scheduler.submit_async(payload, deadline=deadline, is_alive=client_liveness(), exclusive=exclusive)
+    except QueueFullError as e:
+        return queue_full_response(timer, e)
+
+    try:
+        result, stats = future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except TimeoutError:
+        future.cancel()
+        logger.warning("Inference Error: request deadline exceeded")
+        return finish_request(timer, {"error": "Request deadline exceeded"}, 504)
+    except ClientDisconnectedError as e:
+        logger.info(f"Inference Error: {e}")
+        return finish_request(timer, {"error": str(e)}, 499)
+    except Exception as e:
+        logger.error(f"Inference Error: {e}")
+        return finish_request(timer, {"error": f"An error occurred during model inference: {e}"}, 500)
+    timer.add_inference(stats)
+
+    if cache_key is not None:
+        response_cache.put(cache_key, result)
+
+    return finish_request(timer, with_playback_plan(result))
+
+def sse_event(event, data):
+    """Formats one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/transcribe_stream', methods=['POST'])
+def transcribe_audio_stream():
+    """
+    Streaming variant of /transcribe with the same form fields. The response is
+    a `text/event-stream` of server-sent events:
+    - `text`:  {"delta": "..."}  English text as it is decoded
+    - `gloss`: {"word": "..."}   each ASL gloss word as soon as it is complete
+    - `done`:  {"text": "...", "asl_gloss": "..."}  same payload as /transcribe
+    - `error`: {"error": "..."}
+    """
+    timer = RequestTimer("/transcribe_stream")
+    if not model_ready.is_set():
+        return not_ready_response(timer)
+
+    if 'audio' not in request.files:
+        return finish_request(timer, {"error": "No audio file provided"}, 400)
+
+    audio_file = request.files['audio']
+
+    if audio_file.filename == '':
+        return finish_request(timer, {"error": "No audio file selected"}, 400)
+
+    prompt = request.form.get('prompt', "What is this audio about?")
+
+    # The upload is closed once this view returns, so decode it before streaming starts
+    try:
+        audio_bytes = audio_file.read()
+        timer.lap("receive")
+        audio = decode_audio(audio_bytes)
+        timer.lap("decode_audio")
+        audio = preprocess_audio(audio, timer)
+    except AudioDecodeError as e:
+        logger.warning(f"File Handling Error: {e}")
+        return finish_request(timer, {"error": f"An error occurred processing the file: {e}"}, 400)
+    except Exception as e:
+        logger.error(f"File Handling Error: {e}")
+        return finish_request(timer, {"error": f"An error occurred processing the file: {e}"}, 500)
+
+    cache_key, cached = cache_lookup(audio, prompt)
+
+    chunks = None
+    stats = {}
+    if cached is None:
+        # Admission happens here so a full queue is still a plain 503 response
+        logger.debug(f"Streaming audio file: {audio_file.filename} with prompt: '{prompt}'")
+        deadline = request_deadline()
+        is_alive = client_liveness()
+        try:
+            messages = build_messages(audio, prompt)
+            chunks = backend.stream(
+                messages, token_budget([messages]),
+                run=lambda fn: scheduler.submit_async(
+                    lambda: run_exclusive(fn, stats), deadline=deadline, is_alive=is_alive, exclusive=True,
+                ),
+                prefix_cache=prefix_cache,
+                stats=stats,
+            )
+        except QueueFullError as e:
+            return queue_full_response(timer, e)
+
+    def generate_events():
+        status = 200
+        if cached is not None:
+            logger.debug(f"Cache hit: {cached}")
+            if cached["text"]:
+                yield sse_event("text", {"delta": cached["text"]})
+            for word in cached["asl_gloss"].split():
+                yield sse_event("gloss", {"word": word})
+            yield sse_event("done", with_playback_plan(cached))
+        else:
             try:
-                description = do_gemma_3n_inference(model, tokenizer, messages)
-                print(f"Generated Description: {description}")
-                    # Regex to find the content inside the <ASL> tags
-                asl_match = re.search(r"<ASL>(.*?)</ASL>", description)
-
-                if asl_match:
-                    # Extract the English text (before the <ASL> tag)
-                    text = description.split("<ASL>")[0].strip()
-                    # Extract the ASL gloss
-                    asl_gloss = asl_match.group(1).strip()
-                else:
-                    # If no <ASL> tag is found, the whole text is treated as both
-                    text = description.strip()
-                    asl_gloss = description.strip()
-
-                return jsonify({"text": text, "asl_gloss": asl_gloss})
+                parser = AslStreamParser()
+                generated_text = ""
+
+                for chunk in chunks:
+                    generated_text += chunk
+                    for event, value in parser.feed(chunk):
+                        yield sse_event(event, {"delta": value} if event == "text" else {"word": value})
+                for event, value in parser.close():
+                    yield sse_event(event, {"delta": value} if event == "text" else {"word": value})
+                timer.add_inference(stats)
+
+                logger.debug(f"Generated Description: {generated_text}")
+                result = parse_asl_response(generated_text)
+                if cache_key is not None:
+                    response_cache.put(cache_key, result)
+                yield sse_event("done", with_playback_plan(result))
             except Exception as e:
-                print(f"Inference Error: {e}")
-                return jsonify({"error": f"An error occurred during model inference: {e}"}), 500
+                status = 500
+                logger.error(f"Inference Error: {e}")
+                yield sse_event("error", {"error": f"An error occurred during model inference: {e}"})
 
-    except Exception as e:
-        print(f"File Handling Error: {e}")
-        return jsonify({"error": f"An error occurred processing the file: {e}"}), 500
+        timer.lap("serialize")
+        metrics.observe_request(timer, status)
+        logger.info(timer.as_log(status))
+        log_first_request(timer, status)
+
+    return Response(
+        stream_with_context(generate_events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- Bulk Transcription ---
+# /transcribe_batch takes many clips in one request, either as repeated 'audio'
+# file parts or as a manifest of paths on the server under
+# GEMMA_BATCH_MANIFEST_ROOT (unset disables manifests). Clips are fed to the
+# scheduler a few batches at a time, so they run in GPU-sized batches without
+# filling the admission queue, and one JSON line per clip is streamed back as
+# soon as it finishes. A clip the queue still rejects gets a 503 line rather
+# than holding the response (and the clips already done) while it waits.
+BATCH_MANIFEST_ROOT = os.environ.get("GEMMA_BATCH_MANIFEST_ROOT")
+BATCH_JOB_IN_FLIGHT = int(os.environ.get("GEMMA_BATCH_JOB_IN_FLIGHT", 2 * BATCH_MAX_SIZE))
+
+def manifest_paths(manifest):
+    """Resolves manifest entries, which must all lie under GEMMA_BATCH_MANIFEST_ROOT."""
+    if isinstance(manifest, str):
+        try:
+            manifest = json.loads(manifest)
+        except ValueError:
+            manifest = manifest.splitlines()
+    root = os.path.realpath(BATCH_MANIFEST_ROOT)
+    paths = []
+    for entry in manifest:
+        entry = str(entry).strip()
+        if not entry:
+            continue
+        path = os.path.realpath(os.path.join(root, entry))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Manifest path outside of the manifest root: {entry}")
+        paths.append((entry, path))
+    return paths
+
+@app.route('/transcribe_batch', methods=['POST'])
+def transcribe_batch():
+    """
+    Bulk variant of /transcribe. Send either:
+    - several file parts named 'audio' (and optionally a 'prompt' field), or
+    - a 'manifest' field (or JSON body {"manifest": [...], "prompt": "..."})
+      listing audio files relative to GEMMA_BATCH_MANIFEST_ROOT.
+
+    The response is `application/x-ndjson`, one line per clip in completion
+    order: {"index", "name", "text", "asl_gloss"} or {"index", "name", "error"},
+    followed by a {"done": true, "clips", "errors", "rejected"} summary line.
+    Clips the full admission queue turns away get {"index", "name", "error",
+    "status": 503, "retry_after"} and can be sent again.
+    """
+    timer = RequestTimer("/transcribe_batch")
+    if not model_ready.is_set():
+        return not_ready_response(timer)
+
+    body = request.get_json(silent=True)
+    if body is None:
+        body = {}
+    elif not isinstance(body, dict):
+        return finish_request(timer, {"error": "JSON body must be an object"}, 400)
+    prompt = body.get("prompt") or request.form.get('prompt', "What is this audio about?")
+    manifest = body.get("manifest") or request.form.get("manifest")
+
+    if manifest:
+        if not BATCH_MANIFEST_ROOT:
+            return finish_request(timer, {"error": "Manifests are disabled on this server"}, 403)
+        try:
+            clips = manifest_paths(manifest)
+        except (TypeError, ValueError) as e:
+            return finish_request(timer, {"error": str(e)}, 400)
+    else:
+        # Uploads are closed once this view returns, so read them now
+        clips = [(audio_file.filename, audio_file.read()) for audio_file in request.files.getlist('audio')]
+    if not clips:
+        return finish_request(timer, {"error": "No audio files provided"}, 400)
+    timer.lap("receive")
+
+    is_alive = client_liveness()
+
+    def load_clip(data):
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                data = f.read()
+        return preprocess_audio(decode_audio(data))
+
+    def clip_line(index, name, **fields):
+        return json.dumps({"index": index, "name": name, **fields}) + "\n"
+
+    def generate_lines():
+        pending = {}  # future -> (index, name, cache key)
+        remaining = iter(enumerate(clips))
+        exhausted = False
+        errors = 0
+        rejected = 0
+
+        while pending or not exhausted:
+            while not exhausted and len(pending) < BATCH_JOB_IN_FLIGHT:
+                try:
+                    index, (name, data) = next(remaining)
+                except StopIteration:
+                    exhausted = True
+                    break
+                try:
+                    audio = load_clip(data)
+                except Exception as e:
+                    # Any decode or preprocessing failure costs this clip only, not the job
+                    errors += 1
+                    if not isinstance(e, (OSError, AudioDecodeError)):
+                        logger.exception(f"Failed to load clip {name}")
+                    yield clip_line(index, name, error=f"An error occurred processing the file: {e}")
+                    continue
+
+                cache_key, cached = cache_lookup(audio, prompt)
+                if cached is not None:
+                    yield clip_line(index, name, **with_playback_plan(cached))
+                    continue
+
+                payload, exclusive = inference_payload(audio, prompt)
+                try:
+                    future = scheduler.submit_async(payload, is_alive=is_alive, exclusive=exclusive)
+                except QueueFullError as e:
+                    # The queue is shared with interactive traffic; the client resends the rejected clips
+                    rejected += 1
+                    logger.warning(f"Rejected {name}: {e}")
+                    yield clip_line(index, name, error="Server is busy, please retry later", status=503,
+                                    retry_after=e.retry_after)
+                    continue
+                pending[future] = (index, name, cache_key)
+
+            if not pending:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, name, cache_key = pending.pop(future)
+                try:
+                    result, _ = future.result()
+                except Exception as e:
+                    errors += 1
+                    logger.error(f"Inference Error for {name}: {e}")
+                    yield clip_line(index, name, error=f"An error occurred during model inference: {e}")
+                    continue
+                if cache_key is not None:
+                    response_cache.put(cache_key, result)
+                yield clip_line(index, name, **with_playback_plan(result))
+
+        yield json.dumps({"done": True, "clips": len(clips), "errors": errors, "rejected": rejected}) + "\n"
+        timer.lap("serialize")
+        metrics.observe_request(timer, 200)
+        logger.info(timer.as_log(200))
+        logger.info(f"Batch job finished: {len(clips)} clips, {errors} errors, {rejected} rejected "
+                    f"in {timer.total():.1f}s")
+
+    return Response(stream_with_context(generate_lines()), mimetype="application/x-ndjson")
+
+@app.route('/resolve_gloss', methods=['POST'])
+def resolve_gloss():
+    """
+    Resolves a gloss without transcribing anything. Send JSON {"gloss": "..."}
+    (or a 'gloss' form field); the response is the playback plan.
+    """
+    if lexicon is None:
+        return jsonify({"error": "No sign lexicon is configured"}), 404
+    body = request.get_json(silent=True) or {}
+    gloss = body.get("gloss") or request.form.get("gloss")
+    if not gloss:
+        return jsonify({"error": "No gloss provided"}), 400
+    return jsonify(lexicon.resolve(gloss))
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters and size of the response and prompt-prefix caches."""
+    stats = {"enabled": response_cache is not None}
+    if response_cache is not None:
+        stats.update(response_cache.stats())
+    if prefix_cache is not None:
+        stats["prefix_cache"] = prefix_cache.stats()
+    return jsonify(stats)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and the model has not failed to load."""
+    status = 500 if startup["state"] == "failed" else 200
+    return jsonify({"status": startup["state"], "error": startup["error"]}), status
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: the model is loaded and warmed up."""
+    return jsonify(startup), 200 if model_ready.is_set() else 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    body, content_type = metrics.render()
+    return Response(body, mimetype=content_type)
 
 # --- Main Application Runner ---
 if __name__ == '__main__':
-    # Runs the Flask app on http://127.0.0.1:5000
+    # Runs the app on http://127.0.0.1:5000 (or GEMMA_PORT)
     # Use host='0.0.0.0' to make it accessible on your local network
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    if SERVER == "waitress":
+        from waitress import serve
+        # Request lookahead lets waitress notice clients that hang up while queued
+        serve(app, host='0.0.0.0', port=PORT, threads=SERVER_THREADS, channel_request_lookahead=5)
+    else:
+        app.run(host='0.0.0.0', port=PORT, debug=False, threaded=True)